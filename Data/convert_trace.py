@@ -0,0 +1,78 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.simulation_trace import (  # noqa: E402
+    ROWS_PER_CHUNK,
+    is_chunked_trace,
+    iter_trace_records,
+    write_chunked_trace,
+)
+
+# Thay cho merge_json.py / split_json.py: chuyển dữ liệu mô phỏng (JSON array,
+# có thể chia nhiều phần) sang thư mục chunk NDJSON + zstd kèm manifest.
+# Mỗi chunk nhỏ (vài MB) nên push được lên GitHub, không cần tách/nối file nữa,
+# và process_simulation.py đọc các chunk song song.
+
+# Cấu hình tên file
+DEFAULT_INPUTS = [
+    os.path.join("Data", "simulation_data_part1.json"),
+    os.path.join("Data", "simulation_data_part2.json"),
+]
+FALLBACK_INPUT = os.path.join("Data", "simulation_data.json")
+OUTPUT_DIR = os.path.join("Data", "simulation_trace")
+
+
+def iter_inputs(paths):
+    for path in paths:
+        print(f"📖 Đang đọc '{path}'...")
+        yield from iter_trace_records(path)
+
+
+def convert(inputs, output_dir, rows_per_chunk, force):
+    if is_chunked_trace(output_dir) and not force:
+        print(f"✅ '{output_dir}' đã có manifest, bỏ qua (dùng --force để ghi lại).")
+        return
+
+    if not inputs:
+        inputs = [p for p in DEFAULT_INPUTS if os.path.exists(p)] or [FALLBACK_INPUT]
+    missing = [p for p in inputs if not os.path.exists(p)]
+    if missing:
+        print(f"❌ Lỗi: Không tìm thấy {', '.join(missing)}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    manifest = write_chunked_trace(iter_inputs(inputs), output_dir, rows_per_chunk=rows_per_chunk)
+    elapsed = time.perf_counter() - started
+    size = sum(chunk["bytes"] for chunk in manifest["chunks"])
+    print(
+        f"✅ HOÀN TẤT! {manifest['rows']:,} dòng -> {len(manifest['chunks'])} chunk "
+        f"({size / 1024 / 1024:,.1f} MB) trong {elapsed:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chuyển dữ liệu mô phỏng sang định dạng chunk NDJSON + zstd")
+    parser.add_argument("inputs", nargs="*", help="File JSON array/NDJSON đầu vào (mặc định: các phần simulation_data)")
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR)
+    parser.add_argument("--rows-per-chunk", type=int, default=ROWS_PER_CHUNK)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    convert(args.inputs, args.output, args.rows_per_chunk, args.force)
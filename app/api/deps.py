@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -91,4 +91,36 @@ async def get_current_manager(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Yêu cầu quyền Quản lý.",
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+BBox = tuple[float, float, float, float]
+
+
+def get_bbox(
+    bbox: Optional[str] = Query(
+        None,
+        description="Khung nhìn: minLon,minLat,maxLon,maxLat",
+        examples=["105.80,21.00,105.86,21.05"],
+    ),
+) -> Optional[BBox]:
+    if bbox is None:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox phải có dạng minLon,minLat,maxLon,maxLat",
+        )
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= 90 and -90 <= max_lat <= 90):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox không hợp lệ: kinh độ trong [-180, 180], vĩ độ trong [-90, 90]",
+        )
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox không hợp lệ: min phải nhỏ hơn max",
+        )
+    return min_lon, min_lat, max_lon, max_lat
@@ -13,42 +13,42 @@
 # limitations under the License.
 
 from fastapi import APIRouter, Query
-import httpx
+from fastapi.responses import StreamingResponse
 from app.core.config import settings
+from app.services.orion import orion, stream_entities
 
 router = APIRouter(prefix="/aqi", tags=["aqi"])
 
 @router.get("/hanoi")
-async def get_live_hanoi_aqi(limit: int = Query(100, ge=1, le=1000, description="Số lượng trạm tối đa")):
+async def get_live_hanoi_aqi(
+    limit: int = Query(100, ge=1, le=1000, description="Số lượng trạm tối đa"),
+    all_: bool = Query(False, alias="all", description="True: Lấy toàn bộ các trạm (bỏ qua limit), stream kết quả"),
+):
     """
     Lấy dữ liệu AQI từ Orion-LD.
-    Hỗ trợ ?limit=10 để giới hạn kết quả.
+    Hỗ trợ ?limit=10 để giới hạn kết quả, ?all=true để lấy toàn bộ (tải các trang song song).
     """
-    orion_url = f"{settings.orion_broker_url}/ngsi-ld/v1/entities"
     full_type = f"{settings.aqi_service_path}/AirQualityObserved"
     params = {
         "type": full_type,
         "limit": limit
     }
-    
-    headers = {
-        "Accept": "application/ld+json",
-        "Link": '<https://raw.githubusercontent.com/smart-data-models/dataModel.Environment/master/context.jsonld>; rel="http://www.w3.org/ns/ldp#context"; type="application/ld+json"'
-    }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(orion_url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            orion_data = response.json()
-            
-            return {
-                "source": "Orion-LD Context Broker",
-                "limit_requested": limit, 
-                "count": len(orion_data),
-                "data": orion_data,
-            }
+        if all_:
+            params.pop("limit")
+            pages = orion.iter_entity_pages(params, context=settings.ngsi_context_url)
+            body = await stream_entities(pages, envelope={"source": "Orion-LD Context Broker"})
+            return StreamingResponse(body, media_type="application/json")
+
+        orion_data = await orion.query_entities(params, context=settings.ngsi_context_url)
+        
+        return {
+            "source": "Orion-LD Context Broker",
+            "limit_requested": limit, 
+            "count": len(orion_data),
+            "data": orion_data,
+        }
             
     except Exception as exc:
         return {
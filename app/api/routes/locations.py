@@ -12,67 +12,42 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Optional, Any, Dict
-import httpx
-from fastapi import APIRouter, Depends, HTTPException, Query
+import logging
+from typing import List, Optional, Any, Dict, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
-from app.api.deps import get_current_admin, get_current_manager
+from app.api.deps import BBox, get_bbox, get_current_admin, get_current_manager
 from app.db.session import get_db
+from app.core.cache import SWRCache
 from app.core.config import settings
+from app.core.encoding import STREAM_ENCODINGS, etag_matches, pick_encoding
 from app.models.enums import LocationType
+from app.services import location_clusters, location_export
+from app.services.orion import orion, stream_entities
+from app.services.orion_outbox import outbox_drainer
 
 router = APIRouter(prefix="/locations", tags=["locations"])
+logger = logging.getLogger(__name__)
 
-# --- CẤU HÌNH ORION ---
-ORION_BASE_URL = f"{settings.orion_broker_url}/ngsi-ld/v1/entities"
-ORION_UPSERT_URL = f"{settings.orion_broker_url}/ngsi-ld/v1/entityOperations/upsert?options=update"
-CONTEXT = settings.ngsi_context_transportation
-HEADERS = {"Content-Type": "application/ld+json", "Accept": "application/json"}
-
-# --- HELPER: Đồng bộ sang Orion ---
-async def push_location_to_orion(location_obj: models.GreenLocation):
-    """Đồng bộ (Tạo mới/Cập nhật) sang Orion-LD"""
-    # Convert DB Object -> Schema để dễ lấy dữ liệu (lat/lon)
-    loc_data = schemas.LocationRead.model_validate(location_obj)
-    
-    entity_id = f"urn:ngsi-ld:{loc_data.location_type.value}:{loc_data.id}"
-    
-    payload = {
-        "id": entity_id,
-        "type": loc_data.location_type.value,
-        "name": {"type": "Property", "value": loc_data.name},
-        "location": {
-            "type": "GeoProperty",
-            "value": {"type": "Point", "coordinates": [loc_data.longitude, loc_data.latitude]}
-        },
-        "source": {"type": "Property", "value": "Admin Created"},
-        "@context": CONTEXT
-    }
-    
-    if loc_data.description:
-        payload["description"] = {"type": "Property", "value": loc_data.description}
-
-    async with httpx.AsyncClient() as client:
-        try:
-            # Dùng list [payload] cho endpoint upsert
-            await client.post(ORION_UPSERT_URL, json=[payload], headers=HEADERS)
-            print(f"✅ Đã đồng bộ {entity_id} sang Orion")
-        except Exception as e:
-            print(f"❌ Lỗi Orion Upsert: {e}")
-
-async def delete_location_from_orion(location_type: str, location_id: int):
-    """Xóa khỏi Orion"""
-    entity_id = f"urn:ngsi-ld:{location_type}:{location_id}"
-    url = f"{ORION_BASE_URL}/{entity_id}"
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            await client.delete(url, headers=HEADERS)
-            print(f"🗑️ Đã xóa {entity_id} khỏi Orion")
-        except Exception as e:
-            print(f"❌ Lỗi Orion Delete: {e}")
+# Cache danh sách địa điểm (theo worker), xóa khi Tạo/Sửa/Xóa qua API.
+# Thay đổi từ nguồn khác (sync_to_orion.py...) được cập nhật sau tối đa TTL.
+locations_cache = SWRCache(
+    ttl=settings.locations_cache_ttl,
+    stale_ttl=settings.locations_cache_stale,
+)
+
+# Đồng bộ sang Orion không nằm trên đường request: crud ghi outbox cùng
+# transaction, outbox_drainer gửi ở nền (app/services/orion_outbox.py).
+# Danh sách đọc từ Orion nên cache được xóa lại khi drainer gửi xong.
+outbox_drainer.on_synced.append(locations_cache.invalidate)
+
+def _after_write() -> None:
+    outbox_drainer.notify()
+    locations_cache.invalidate()
 
 # --- API ENDPOINTS ---
 
@@ -82,12 +57,100 @@ async def create_new_location(
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_manager),
 ):
-    # 1. Lưu Postgres
+    # Lưu Postgres (kèm outbox đồng bộ Orion)
     db_location = await crud.create_location(db=db, location=location)
-    # 2. Đồng bộ Orion
-    await push_location_to_orion(db_location)
+    _after_write()
     return db_location
 
+@router.get(".geojson")
+async def export_locations_geojson(
+    type: Optional[LocationType] = Query(None, description="Lọc theo loại địa điểm"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """
+    Toàn bộ địa điểm (Postgres) thành một GeoJSON FeatureCollection, stream
+    từ server-side cursor và nén dần (br/gzip). ETag theo phiên bản dữ liệu
+    green_locations, đọc cùng snapshot với các dòng; hỗ trợ If-None-Match (304).
+    """
+    encoding = pick_encoding(accept_encoding, STREAM_ENCODINGS)
+    stream = location_export.FeatureCollectionStream(type, encoding)
+    version = await stream.open()
+    headers = {
+        "ETag": location_export.etag(version, type),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        await stream.close()
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    # background: đóng kết nối cả khi response không chạy tới hết stream
+    return StreamingResponse(
+        stream,
+        media_type="application/geo+json",
+        headers=headers,
+        background=BackgroundTask(stream.close),
+    )
+
+# /near, /within, /search và /clusters phải khai báo trước /{location_id}
+@router.get("/near", response_model=List[schemas.LocationNearRead])
+async def read_locations_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: Optional[float] = Query(None, gt=0, description="Bán kính tìm kiếm (mét)"),
+    type: Optional[LocationType] = Query(None, description="Lọc theo loại địa điểm"),
+    k: int = Query(20, ge=1, le=200, description="Số địa điểm gần nhất"),
+    db: AsyncSession = Depends(get_db),
+):
+    """k địa điểm gần nhất (Postgres, KNN qua chỉ mục GiST), sắp theo khoảng cách `distance_m`."""
+    rows = await crud.get_locations_near(db, lat, lon, k=k, radius=radius, location_type=type)
+    return [
+        schemas.LocationNearRead.model_validate(location).model_copy(update={"distance_m": distance})
+        for location, distance in rows
+    ]
+
+@router.get("/within", response_model=List[schemas.LocationRead])
+async def read_locations_within(
+    bbox: Optional[BBox] = Depends(get_bbox),
+    type: Optional[LocationType] = Query(None, description="Lọc theo loại địa điểm"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Địa điểm trong khung nhìn `bbox` (Postgres, lọc qua chỉ mục GiST)."""
+    if bbox is None:
+        raise HTTPException(status_code=400, detail="Thiếu bbox")
+    return await crud.get_locations_within(db, bbox, location_type=type, limit=limit)
+
+@router.get("/search", response_model=List[schemas.LocationSearchRead])
+async def search_locations(
+    q: str = Query(..., min_length=1, max_length=100, description="Tên địa điểm, có dấu hoặc không dấu"),
+    type: Optional[LocationType] = Query(None, description="Lọc theo loại địa điểm"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """Tìm địa điểm theo tên (Postgres, chỉ mục trigram), bỏ qua dấu tiếng Việt, xếp theo độ khớp `score`."""
+    rows = await crud.search_locations(db, q.strip(), limit=limit, location_type=type)
+    return [
+        schemas.LocationSearchRead.model_validate(location).model_copy(update={"score": score})
+        for location, score in rows
+    ]
+
+@router.get("/clusters", response_model=List[schemas.LocationCluster])
+async def read_location_clusters(
+    z: int = Query(..., ge=0, le=22, description="Mức zoom bản đồ"),
+    bbox: Optional[BBox] = Depends(get_bbox),
+    type: Optional[LocationType] = Query(None, description="Lọc theo loại địa điểm"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Cụm địa điểm theo mức zoom (gộp theo lưới), mỗi cụm gồm tâm và số điểm.
+    Cụm được tính sẵn cho từng zoom và giữ tới khi green_locations thay đổi.
+    """
+    return await location_clusters.get_clusters(db, z, bbox, type)
+
 @router.get("/{location_id}", response_model=schemas.LocationRead)
 async def read_location_detail(
     location_id: int,
@@ -106,16 +169,14 @@ async def update_location(
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_manager),
 ):
-    """Cập nhật địa điểm -> Đồng bộ sang Orion"""
+    """Cập nhật địa điểm -> Đồng bộ sang Orion (ở nền)"""
     location = await crud.get_location(db, location_id)
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
     
-    # Update DB
+    # Update DB (kèm outbox đồng bộ Orion)
     updated_location = await crud.update_location(db, db_obj=location, obj_in=location_in)
-    
-    # Update Orion
-    await push_location_to_orion(updated_location)
+    _after_write()
     
     return updated_location
 
@@ -125,35 +186,74 @@ async def delete_location(
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_admin),
 ):
-    """Xóa địa điểm -> Xóa khỏi Orion (chỉ Admin)"""
+    """Xóa địa điểm -> Xóa khỏi Orion ở nền (chỉ Admin)"""
     location = await crud.get_location(db, location_id)
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
     
-    loc_type = location.location_type.value
-    
-    # Delete DB
+    # Delete DB (kèm outbox đồng bộ Orion)
     await crud.delete_location(db, location_id)
-    
-    # Delete Orion
-    await delete_location_from_orion(loc_type, location_id)
+    _after_write()
     
     return {"message": "Location deleted successfully"}
 
-@router.get("")
+@router.get("", response_model=None)
 async def read_all_locations(
     location_type: Optional[LocationType] = None,
     limit: int = Query(100, ge=1),
     skip: int = Query(0, ge=0),
     options: str = "keyValues",
     # --- THAM SỐ ĐỂ PHÂN LUỒNG ---
-    raw: bool = Query(False, description="True: Trả về chuẩn NGSI-LD (cho bên thứ 3). False: Trả về định dạng CMS (cho Admin).")
-) -> List[Dict[str, Any]]:
+    raw: bool = Query(False, description="True: Trả về chuẩn NGSI-LD (cho bên thứ 3). False: Trả về định dạng CMS (cho Admin)."),
+    all_: bool = Query(False, alias="all", description="True: Lấy toàn bộ (bỏ qua limit/skip), stream kết quả."),
+) -> Union[List[Dict[str, Any]], StreamingResponse]:
     """
     Lấy danh sách địa điểm từ Orion-LD.
     Hỗ trợ 2 chế độ hiển thị (Raw/CMS) để phục vụ cả tích hợp hệ thống và quản trị nội bộ.
+    Kết quả được cache trong tiến trình (stale-while-revalidate), xóa khi có Tạo/Sửa/Xóa.
+    `all=true`: tải mọi trang từ Orion song song và stream ngay (không cache).
     """
-    
+    if all_:
+        return await stream_all_locations_from_orion(location_type, options, raw)
+
+    key = (location_type, limit, skip, options, raw)
+    return await locations_cache.get_or_load(
+        key, lambda: fetch_locations_from_orion(location_type, limit, skip, options, raw)
+    )
+
+
+def _to_cms_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Xử lý một entity để Frontend (Admin Dashboard) dễ dùng hơn."""
+    # 1. Làm sạch Key (Flatten) - Phòng hờ Orion không rút gọn hết
+    if "https://smartdatamodels.org/name" in item:
+        item["name"] = item.pop("https://smartdatamodels.org/name")
+    if "https://smartdatamodels.org/source" in item:
+        item["data_source"] = item.pop("https://smartdatamodels.org/source")
+
+    # Một số trường hợp description bị dính prefix
+    if "https://smartdatamodels.org/description" in item:
+        item["description"] = item.pop("https://smartdatamodels.org/description")
+
+    # 2. Xử lý ID (Tách số để gọi API Sửa/Xóa)
+    orion_id = item.get("id", "")
+    parts = orion_id.split(":")
+
+    if parts and parts[-1].isdigit():
+        item["db_id"] = int(parts[-1]) # ID số (cho Postgres)
+        item["is_editable"] = True
+    else:
+        item["db_id"] = None           # Không có trong Postgres
+        item["is_editable"] = False    # Chỉ xem
+    return item
+
+
+async def fetch_locations_from_orion(
+    location_type: Optional[LocationType],
+    limit: int,
+    skip: int,
+    options: str,
+    raw: bool,
+) -> List[Dict[str, Any]]:
     params = {
         "limit": limit,
         "offset": skip,
@@ -163,55 +263,36 @@ async def read_all_locations(
     if location_type:
         params["type"] = location_type.value
 
-    # Dùng Context Giao thông để Orion tự động rút gọn key (nếu có thể)
-    read_headers = {
-        "Accept": "application/ld+json",
-        "Link": f'<{settings.ngsi_context_transportation}>; rel="http://www.w3.org/ns/ldp#context"; type="application/ld+json"'
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            # Gọi sang Orion
-            response = await client.get(ORION_BASE_URL, params=params, headers=read_headers)
-            
-            if response.status_code == 404: 
-                return []
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            # === TRƯỜNG HỢP 1: BÊN THỨ 3 (RAW DATA) ===
-            if raw:
-                # Trả về nguyên bản, giữ nguyên @context và ID dạng URN
-                return data
-
-            # === TRƯỜNG HỢP 2: ADMIN DASHBOARD (PROCESSED DATA) ===
-            # Xử lý để Frontend dễ dùng hơn
-            for item in data:
-                # 1. Làm sạch Key (Flatten) - Phòng hờ Orion không rút gọn hết
-                if "https://smartdatamodels.org/name" in item:
-                    item["name"] = item.pop("https://smartdatamodels.org/name")
-                if "https://smartdatamodels.org/source" in item:
-                    item["data_source"] = item.pop("https://smartdatamodels.org/source")
-                
-                # Một số trường hợp description bị dính prefix
-                if "https://smartdatamodels.org/description" in item:
-                    item["description"] = item.pop("https://smartdatamodels.org/description")
-
-                # 2. Xử lý ID (Tách số để gọi API Sửa/Xóa)
-                orion_id = item.get("id", "")
-                parts = orion_id.split(":")
-                
-                if parts and parts[-1].isdigit():
-                    item["db_id"] = int(parts[-1]) # ID số (cho Postgres)
-                    item["is_editable"] = True
-                else:
-                    item["db_id"] = None           # Không có trong Postgres
-                    item["is_editable"] = False    # Chỉ xem
-            
+    try:
+        # Gọi sang Orion (client dùng chung). Dùng Context Giao thông để Orion tự động rút gọn key (nếu có thể)
+        data = await orion.query_entities(params, context=settings.ngsi_context_transportation)
+        
+        # === TRƯỜNG HỢP 1: BÊN THỨ 3 (RAW DATA) ===
+        if raw:
+            # Trả về nguyên bản, giữ nguyên @context và ID dạng URN
             return data
 
-        except Exception as e:
-            # Log lỗi ra console server để dễ debug
-            print(f"Error fetching locations: {e}")
-            raise HTTPException(status_code=500, detail=f"Orion Error: {str(e)}")
\ No newline at end of file
+        # === TRƯỜNG HỢP 2: ADMIN DASHBOARD (PROCESSED DATA) ===
+        return [_to_cms_item(item) for item in data]
+
+    except Exception as e:
+        logger.warning("Error fetching locations: %s", e)
+        raise HTTPException(status_code=500, detail=f"Orion Error: {str(e)}")
+
+
+async def stream_all_locations_from_orion(
+    location_type: Optional[LocationType],
+    options: str,
+    raw: bool,
+) -> StreamingResponse:
+    params = {"options": options}
+    if location_type:
+        params["type"] = location_type.value
+
+    try:
+        pages = orion.iter_entity_pages(params, context=settings.ngsi_context_transportation)
+        body = await stream_entities(pages, transform=None if raw else _to_cms_item)
+    except Exception as e:
+        logger.warning("Error fetching locations: %s", e)
+        raise HTTPException(status_code=500, detail=f"Orion Error: {str(e)}")
+    return StreamingResponse(body, media_type="application/json")
@@ -12,70 +12,315 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import time
-import json
-from fastapi import APIRouter, Depends
+import base64
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
-from app.db.session import get_db
+from app.api.deps import BBox, get_bbox
+from app.db.session import AsyncSessionLocal, get_db
+from app.services import simulation_clock, traffic_db, traffic_segments, traffic_store, traffic_tiles
+from app.services.traffic_store import COLOR_CODES, DATA_INTERVAL, LOOP_DURATION
+from app.services.traffic_stream import TrafficTicker
 
 router = APIRouter(prefix="/traffic", tags=["traffic"])
 
-# Cấu hình mô phỏng
-LOOP_DURATION = 3600 
-START_TIME_REF = time.time()
-DATA_INTERVAL = 10 
+async def _load_status(query_second: int) -> dict[str, str]:
+    store = traffic_store.get_frame_store()
+    if store is not None:
+        return store.status(store.slot_for(query_second))
+    async with AsyncSessionLocal() as db:
+        return await traffic_db.query_status(db, query_second)
+
+
+# Một ticker cho mỗi worker, dùng chung cho mọi kết nối /traffic/stream
+ticker = TrafficTicker(
+    simulation_clock.elapsed, _load_status, rate=simulation_clock.playback_rate()
+)
 
 @router.get("/segments")
-async def get_static_map(db: AsyncSession = Depends(get_db)):
+async def get_static_map(
+    bbox: Optional[BBox] = Depends(get_bbox),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Lấy bản đồ nền (GeoJSON) các đoạn đường giao thông.
+    Toàn bộ mạng lưới được dựng và nén sẵn (br/gzip), hỗ trợ ETag + If-None-Match (304).
+    Có `bbox` thì chỉ trả về các đoạn trong khung nhìn (truy vấn qua chỉ mục GiST).
+    """
+    if bbox is not None:
+        return Response(
+            content=await traffic_segments.build_feature_collection(db, bbox),
+            media_type="application/json",
+        )
+
+    payload = await traffic_segments.get_segments_payload(db)
+    encoding = payload.pick_encoding(accept_encoding)
+    headers = {
+        "ETag": payload.etag(encoding),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+    if payload.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=payload.bodies[encoding],
+        media_type="application/json",
+        headers=headers,
+    )
+
+MAX_TIMELINE_SEGMENTS = 200
+
+
+def _timeline_times(interval: int, slot_count: int) -> list[int]:
+    return [slot * interval for slot in range(slot_count)]
+
+
+async def _load_timelines(
+    db: AsyncSession, segment_ids: list[str]
+) -> dict[str, dict[str, list]]:
+    store = traffic_store.get_frame_store()
+    if store is not None and store.has_speeds:
+        timelines = {}
+        for segment_id in segment_ids:
+            index = store.index_of(segment_id)
+            if index is not None:
+                speeds, colors = store.timeline(index)
+                timelines[segment_id] = {"speeds": speeds, "colors": colors}
+        return timelines
+
+    return {
+        segment_id: {"speeds": speeds, "colors": colors}
+        for segment_id, (speeds, colors) in (await traffic_db.query_timelines(db, segment_ids)).items()
+    }
+
+
+@router.get("/segments/timeline")
+async def get_segments_timeline(
+    ids: str = Query(..., description="Danh sách ID đoạn đường, ngăn cách bằng dấu phẩy"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Chuỗi tốc độ/màu cả vòng lặp cho nhiều đoạn đường một lần.
+    ID không tồn tại được liệt kê trong `missing`.
+    """
+    segment_ids = list(dict.fromkeys(part.strip() for part in ids.split(",") if part.strip()))
+    if not segment_ids:
+        raise HTTPException(status_code=400, detail="Thiếu ids")
+    if len(segment_ids) > MAX_TIMELINE_SEGMENTS:
+        raise HTTPException(
+            status_code=400, detail=f"Tối đa {MAX_TIMELINE_SEGMENTS} đoạn đường mỗi request"
+        )
+
+    timelines = await _load_timelines(db, segment_ids)
+    return {
+        "interval": DATA_INTERVAL,
+        "times": _timeline_times(DATA_INTERVAL, LOOP_DURATION // DATA_INTERVAL),
+        "segments": timelines,
+        "missing": [segment_id for segment_id in segment_ids if segment_id not in timelines],
+    }
+
+
+@router.get("/segments/{segment_id}/timeline")
+async def get_segment_timeline(segment_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Tốc độ trung bình (km/h, null = không có xe) và màu của một đoạn đường
+    tại mọi mốc 10s trong vòng lặp. Đọc từ kho frame (dải float32 liên tục
+    của đoạn đường) nếu có, ngược lại truy vấn Postgres.
+    """
+    timelines = await _load_timelines(db, [segment_id])
+    if segment_id not in timelines:
+        raise HTTPException(status_code=404, detail="Không tìm thấy đoạn đường")
+    return {
+        "segment_id": segment_id,
+        "interval": DATA_INTERVAL,
+        "times": _timeline_times(DATA_INTERVAL, LOOP_DURATION // DATA_INTERVAL),
+        **timelines[segment_id],
+    }
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_segment_tile(z: int, x: int, y: int, db: AsyncSession = Depends(get_db)):
+    """
+    Vector tile (Mapbox MVT) các đoạn đường, layer `traffic`, thuộc tính `id`.
+    Độ đơn giản hóa tăng dần khi zoom nhỏ, đoạn quá ngắn bị lược bỏ ở zoom thấp.
     """
-    query = """
-        SELECT 
-            id, 
-            ST_AsGeoJSON(ST_Simplify(geom, 0.0001), 6) as geometry 
-        FROM traffic_segments
-    """
-    result = await db.execute(text(query))
-    
-    features = []
-    for row in result.mappings():
-        geom_str = row.geometry
-        if not geom_str: continue
-        geom = json.loads(geom_str)
-        segment_name = f"Đoạn đường {row.id}"
-        
-        features.append({
-            "type": "Feature",
-            "id": str(row.id),
-            "geometry": geom,
-            "properties": {
-                "id": str(row.id), 
-                "name": segment_name
-            }
-        })
-        
-    return {"type": "FeatureCollection", "features": features}
+    if not traffic_tiles.is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile không tồn tại")
+
+    tile = await traffic_tiles.get_tile(db, z, x, y)
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": "public, max-age=300"},
+    )
 
 @router.get("/live")
-async def get_live_status(db: AsyncSession = Depends(get_db)):
+async def get_live_status(
+    since: Optional[int] = Query(
+        None,
+        ge=0,
+        description="time_query của lần gọi trước. Chỉ trả về các đoạn đường đổi màu kể từ mốc đó.",
+    ),
+    bbox: Optional[BBox] = Depends(get_bbox),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Lấy trạng thái hiện tại.
     Tự động làm tròn thời gian xuống mốc 10s gần nhất.
+    Thời gian mô phỏng tính từ SIMULATION_EPOCH (chung cho mọi worker),
+    nhân với SIMULATION_PLAYBACK_RATE.
+    Đọc từ kho frame mmap nếu có, ngược lại truy vấn Postgres
+    (bảng simulation_frames hoặc simulation_slots theo TRAFFIC_FRAME_LAYOUT).
+    Với `since`, `full=false` nghĩa là `status` chỉ chứa phần thay đổi
+    (màu null = đoạn đường không còn dữ liệu); `full=true` là snapshot đầy đủ.
+    Có `bbox` thì chỉ trả về các đoạn trong khung nhìn (dùng lưới ô dựng sẵn).
     """
 
-    raw_second = int(time.time() - START_TIME_REF) % LOOP_DURATION
-    query_second = (raw_second // DATA_INTERVAL) * DATA_INTERVAL
-    query = """
-        SELECT segment_id, status_color 
-        FROM simulation_frames 
-        WHERE time_second = :sec
-    """
-    result = await db.execute(text(query), {"sec": query_second})
-    status_map = {str(row.segment_id): row.status_color for row in result.mappings()}
+    raw_second, query_second = simulation_clock.current_second()
+
+    store = traffic_store.get_frame_store()
+    if store is not None:
+        slot = store.slot_for(query_second)
+        indices = store.segments_in_bbox(bbox) if bbox is not None else None
+        status_map = None
+        if since is not None:
+            status_map = store.changes(store.slot_for(since), slot, indices)
+        return {
+            "time_real": raw_second,
+            "time_query": query_second,
+            "since": since,
+            "full": status_map is None,
+            "status": store.status(slot, indices) if status_map is None else status_map,
+        }
+
+    status_map = await traffic_db.query_status(db, query_second, bbox)
     return {
         "time_real": raw_second,
         "time_query": query_second,
+        "since": since,
+        "full": True,
         "status": status_map
-    }
\ No newline at end of file
+    }
+
+# Tối đa một vòng lặp mô phỏng mỗi request
+MAX_REPLAY_FRAMES = LOOP_DURATION // DATA_INTERVAL
+DEFAULT_REPLAY_WINDOW = 600
+
+
+def _window_seconds(
+    from_: Optional[int], to: Optional[int], step: int, default_window: int
+) -> list[int]:
+    """Các mốc giây từ `from_` tới `to` (tính cả hai đầu, vắt qua cuối vòng lặp nếu to < from)."""
+    if step % DATA_INTERVAL:
+        raise HTTPException(status_code=400, detail=f"step phải là bội số của {DATA_INTERVAL}")
+
+    _, now = simulation_clock.current_second()
+    end = now if to is None else to % LOOP_DURATION
+    start = (end - default_window) % LOOP_DURATION if from_ is None else from_ % LOOP_DURATION
+    start -= start % DATA_INTERVAL
+    span = (end - start) % LOOP_DURATION
+    count = span // step + 1
+    if count > MAX_REPLAY_FRAMES:
+        raise HTTPException(status_code=400, detail=f"Tối đa {MAX_REPLAY_FRAMES} frame mỗi request")
+    return [(start + i * step) % LOOP_DURATION for i in range(count)]
+
+
+@router.get("/frames")
+async def get_frames(
+    from_: Optional[int] = Query(
+        None, alias="from", ge=0, description="Giây bắt đầu trong vòng lặp (mặc định: 10 phút trước)"
+    ),
+    to: Optional[int] = Query(
+        None, ge=0, description="Giây kết thúc, tính cả mốc này (mặc định: hiện tại)"
+    ),
+    step: int = Query(DATA_INTERVAL, ge=DATA_INTERVAL, description="Bước nhảy (giây), bội số của 10"),
+    bbox: Optional[BBox] = Depends(get_bbox),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Nhiều frame trong một response, dạng cột, để client tự phát hoạt ảnh.
+    `segments` là danh sách đoạn đường; mỗi phần tử của `frames` là chuỗi base64
+    với byte thứ i là mã màu của `segments[i]` (xem `colors`, 0 = không có dữ liệu).
+    `to < from` nghĩa là cửa sổ vắt qua cuối vòng lặp.
+    """
+    seconds = _window_seconds(from_, to, step, DEFAULT_REPLAY_WINDOW)
+
+    store = traffic_store.get_frame_store()
+    if store is not None:
+        indices = store.segments_in_bbox(bbox) if bbox is not None else None
+        frames = store.frames([store.slot_for(second) for second in seconds], indices)
+        segment_ids = store.segment_ids
+        segments = list(segment_ids) if indices is None else [segment_ids[i] for i in indices]
+    else:
+        segments, frames = await traffic_db.query_frames(db, seconds, bbox)
+
+    return {
+        "from": seconds[0],
+        "to": seconds[-1],
+        "step": step,
+        "times": seconds,
+        "colors": COLOR_CODES,
+        "segments": segments,
+        "frames": [base64.b64encode(frame).decode("ascii") for frame in frames],
+    }
+
+@router.get("/summary")
+async def get_summary(
+    from_: Optional[int] = Query(
+        None, alias="from", ge=0, description="Giây bắt đầu trong vòng lặp (mặc định: mốc hiện tại)"
+    ),
+    to: Optional[int] = Query(None, ge=0, description="Giây kết thúc, tính cả mốc này (mặc định: hiện tại)"),
+    step: int = Query(DATA_INTERVAL, ge=DATA_INTERVAL, description="Bước nhảy (giây), bội số của 10"),
+    top: int = Query(
+        traffic_store.TOP_SLOWEST, ge=0, le=traffic_store.TOP_SLOWEST, description="Số đoạn chậm nhất mỗi mốc"
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Tổng quan ùn tắc toàn mạng cho từng mốc 10s: số đoạn xanh/cam/đỏ,
+    tốc độ trung bình và các đoạn chậm nhất. Được tính sẵn lúc nạp dữ liệu
+    (kho frame), mỗi mốc chỉ là một lần đọc bản ghi cố định.
+    """
+    seconds = _window_seconds(from_, to, step, 0)
+
+    store = traffic_store.get_frame_store()
+    if store is not None and store.has_summary:
+        summaries = {second: store.summary(store.slot_for(second)) for second in seconds}
+    else:
+        summaries = await traffic_db.query_summaries(db, seconds, top)
+
+    empty = {"counts": {"green": 0, "orange": 0, "red": 0}, "mean_speed": None, "slowest": []}
+    slots = []
+    for second in seconds:
+        summary = summaries.get(second, empty)
+        slots.append({"time": second, **summary, "slowest": summary["slowest"][:top]})
+    return {"from": seconds[0], "to": seconds[-1], "step": step, "slots": slots}
+
+@router.get("/stream")
+async def stream_live_status():
+    """
+    Server-Sent Events: đẩy trạng thái giao thông mỗi mốc 10s.
+    Event đầu tiên là snapshot đầy đủ (`full=true`), sau đó chỉ gửi phần thay đổi.
+    Client chậm sẽ bỏ qua frame cũ và nhận snapshot mới nhất.
+    """
+    return StreamingResponse(
+        ticker.frames(sse=True),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/stream")
+async def stream_live_status_ws(websocket: WebSocket):
+    """WebSocket: cùng định dạng message JSON với bản SSE."""
+    await websocket.accept()
+    try:
+        async for payload in ticker.frames():
+            await websocket.send_text(payload)
+    except WebSocketDisconnect:
+        pass
@@ -12,21 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import httpx
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.core.config import settings
 from app.services import weather as weather_service
+from app.services.orion import orion, stream_entities
 
 router = APIRouter(prefix="/weather", tags=["weather"])
 
 @router.get("/hanoi")
 async def get_hanoi_weather(
-    limit: int = Query(100, ge=1, description="Số lượng kết quả")
+    limit: int = Query(100, ge=1, description="Số lượng kết quả"),
+    all_: bool = Query(False, alias="all", description="True: Lấy toàn bộ (bỏ qua limit), stream kết quả"),
 ):
     """
     Lấy dữ liệu thời tiết các quận từ Orion-LD.
+    ?all=true để lấy toàn bộ (tải các trang song song).
     """
-    orion_url = f"{settings.orion_broker_url}/ngsi-ld/v1/entities"
     full_type = "https://smartdatamodels.org/dataModel.Environment/WeatherObserved"
     
     params = {
@@ -34,31 +36,28 @@ async def get_hanoi_weather(
         "limit": limit,
         "options": "keyValues"
     }
-    
-    headers = {
-        "Accept": "application/ld+json",
-        "Link": '<https://raw.githubusercontent.com/smart-data-models/dataModel.Environment/master/context.jsonld>; rel="http://www.w3.org/ns/ldp#context"; type="application/ld+json"'
-    }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(orion_url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            orion_data = response.json()
-            
-            return {
-                "source": "Orion-LD Context Broker",
-                "count": len(orion_data),
-                "data": orion_data
-            }
-            
-        except Exception as e:
-            return {
-                "source": "Orion-LD (Error)",
-                "error": str(e),
-                "hint": "Kiểm tra kết nối tới Orion-LD."
-            }
+    try:
+        if all_:
+            params.pop("limit")
+            pages = orion.iter_entity_pages(params, context=settings.ngsi_context_url)
+            body = await stream_entities(pages, envelope={"source": "Orion-LD Context Broker"})
+            return StreamingResponse(body, media_type="application/json")
+
+        orion_data = await orion.query_entities(params, context=settings.ngsi_context_url)
+        
+        return {
+            "source": "Orion-LD Context Broker",
+            "count": len(orion_data),
+            "data": orion_data
+        }
+        
+    except Exception as e:
+        return {
+            "source": "Orion-LD (Error)",
+            "error": str(e),
+            "hint": "Kiểm tra kết nối tới Orion-LD."
+        }
         
 @router.get("/forecast")
 async def get_weather_forecast(
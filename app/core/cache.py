@@ -0,0 +1,113 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Cache trong tiến trình, giới hạn số phần tử (dùng trong event loop, không thread-safe)."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SWRCache:
+    """
+    Cache bất đồng bộ có TTL, kiểu stale-while-revalidate.
+
+    - Còn hạn (< ttl): trả ngay.
+    - Hết hạn nhưng chưa quá ttl + stale_ttl: trả bản cũ ngay, nạp lại ở nền.
+    - Không có/quá cũ: chờ nạp; các request đồng thời cùng khóa dùng chung một lần nạp.
+
+    `invalidate()` xóa toàn bộ và bỏ kết quả của các lần nạp đang chạy dở.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, maxsize: int = 256):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = LRUCache(maxsize)
+        self._pending: dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, loaded_at = entry
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                return value
+            if age < self.ttl + self.stale_ttl:
+                if key not in self._pending:
+                    self._start_load(key, loader).add_done_callback(_log_refresh_error)
+                return value
+
+        future = self._pending.get(key) or self._start_load(key, loader)
+        return await asyncio.shield(future)
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        generation = self._generation
+
+        async def load():
+            try:
+                value = await loader()
+                if generation == self._generation:
+                    self._entries.set(key, (value, time.monotonic()))
+                return value
+            finally:
+                if self._pending.get(key) is task:
+                    del self._pending[key]
+
+        task = asyncio.ensure_future(load())
+        self._pending[key] = task
+        return task
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._pending.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _log_refresh_error(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Nạp lại cache ở nền thất bại, tiếp tục dùng bản cũ: %s", future.exception())
@@ -35,9 +35,34 @@ class Settings(BaseModel):
     cors_origins: list[str] = os.getenv("CORS_ORIGINS", "*").split(",")
     openaq_api_key: str | None = os.getenv("OPENAQ_API_KEY")
     orion_broker_url: str = os.getenv("ORION_BROKER_URL", "http://localhost:1026")
+    orion_max_connections: int = int(os.getenv("ORION_MAX_CONNECTIONS", "20"))
+    orion_timeout: float = float(os.getenv("ORION_TIMEOUT", "10"))
+    orion_retries: int = int(os.getenv("ORION_RETRIES", "3"))
+    # HTTP/2 cần gói h2 và Orion chạy qua https (httpx chỉ thương lượng h2 qua TLS)
+    orion_http2: bool = os.getenv("ORION_HTTP2", "true").lower() in ("1", "true", "yes")
+    # Số trang Orion tải song song khi đọc toàn bộ (?all=true)
+    orion_page_concurrency: int = int(os.getenv("ORION_PAGE_CONCURRENCY", "4"))
+    # Outbox đồng bộ địa điểm sang Orion: số dòng mỗi lô, chu kỳ quét (giây), backoff tối đa khi lỗi (giây)
+    orion_outbox_batch: int = int(os.getenv("ORION_OUTBOX_BATCH", "100"))
+    orion_outbox_interval: float = float(os.getenv("ORION_OUTBOX_INTERVAL", "2"))
+    orion_outbox_max_backoff: float = float(os.getenv("ORION_OUTBOX_MAX_BACKOFF", "300"))
+    # Thời hạn giữ (lease) các dòng đã nhận để gửi; hết hạn (drainer chết giữa chừng) thì dòng được nhận lại
+    orion_outbox_lease: float = float(os.getenv("ORION_OUTBOX_LEASE", "300"))
     first_superuser: str = os.getenv("FIRST_SUPERUSER", "admin@example.com")
     first_superuser_password: str = os.getenv("FIRST_SUPERUSER_PASSWORD", "123456")
     static_dir: str = os.getenv("STATIC_DIR", "static")
+    traffic_store_path: str = os.getenv("TRAFFIC_STORE_PATH", "Data/traffic_frames.bin")
+    # Bố cục bảng frame giao thông: rows (simulation_frames), packed (simulation_slots) hoặc both
+    traffic_frame_layout: str = os.getenv("TRAFFIC_FRAME_LAYOUT", "rows")
+    # Sai số tối đa (mét) khi đơn giản hóa hình học làn đường lúc nạp (Douglas–Peucker), 0 = giữ mọi điểm
+    traffic_simplify_tolerance: float = float(os.getenv("TRAFFIC_SIMPLIFY_TOLERANCE", "1.0"))
+    # Mốc bắt đầu mô phỏng (Unix timestamp) dùng chung cho mọi worker/máy chủ
+    simulation_epoch: float = float(os.getenv("SIMULATION_EPOCH", "0"))
+    # Tốc độ phát lại: 1 = thời gian thực, 2 = gấp đôi, 10 = gấp 10...
+    simulation_playback_rate: float = float(os.getenv("SIMULATION_PLAYBACK_RATE", "1"))
+    # Cache GET /locations (giây): còn hạn thì trả ngay, quá hạn trong khoảng stale thì trả bản cũ và nạp lại ở nền
+    locations_cache_ttl: float = float(os.getenv("LOCATIONS_CACHE_TTL", "60"))
+    locations_cache_stale: float = float(os.getenv("LOCATIONS_CACHE_STALE", "600"))
     aqi_service_path: str = os.getenv("AQI_SERVICE_PATH", "https://smartdatamodels.org/dataModel.Environment")
     ngsi_context_url: str = os.getenv("NGSI_CONTEXT_URL", "https://raw.githubusercontent.com/smart-data-models/dataModel.Environment/master/context.jsonld")
     ngsi_type_aqi: str = os.getenv("NGSI_TYPE_AQI", "https://smartdatamodels.org/dataModel.Environment/AirQualityObserved")
@@ -71,6 +96,12 @@ class Settings(BaseModel):
         "Mở ứng dụng để xem dự báo thời tiết và chất lượng không khí hôm nay.",
     )
 
+    @validator("simulation_playback_rate")
+    def positive_playback_rate(cls, v: float) -> float:
+        if v <= 0:
+            raise ValueError("SIMULATION_PLAYBACK_RATE phải lớn hơn 0")
+        return v
+
     @validator("cors_origins", pre=True)
     def split_origins(cls, v: str | list[str]) -> list[str]:
         if isinstance(v, str):
@@ -0,0 +1,83 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Chọn Content-Encoding theo Accept-Encoding và nén dần cho response stream."""
+
+import zlib
+from typing import Iterable
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn, thiếu thì chỉ phục vụ gzip
+    brotli = None
+
+STREAM_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def pick_encoding(accept_encoding: str | None, available: Iterable[str]) -> str:
+    """Mã hóa đầu tiên (theo thứ tự `available`) client chấp nhận, không có thì "identity"."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.partition(";")
+        name, _, q = params.strip().partition("=")
+        try:
+            if name.strip() == "q" and float(q) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(token.strip().lower())
+    for encoding in available:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """So khớp If-None-Match với ETag theo kiểu so sánh yếu (bỏ W/)."""
+    if not if_none_match:
+        return False
+    target = etag.removeprefix("W/")
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == target:
+            return True
+    return False
+
+
+class StreamCompressor:
+    """Nén từng chunk của response stream; `flush()` trả phần còn lại ở cuối."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            # quality thấp: nén theo luồng cần nhanh hơn nén tối đa
+            self._compressor = brotli.Compressor(quality=5)
+        elif encoding == "gzip":
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        else:
+            self._compressor = None
+
+    def compress(self, data: bytes) -> bytes:
+        if self._compressor is None:
+            return data
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self._compressor is None:
+            return b""
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
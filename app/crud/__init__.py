@@ -12,7 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from app.crud.location import create_location, get_locations, get_location, update_location, delete_location
+from app.crud.location import (
+    create_location,
+    get_locations,
+    get_locations_near,
+    get_locations_within,
+    search_locations,
+    get_location,
+    update_location,
+    delete_location,
+)
 from app.crud.report import create_report, get_reports, update_report_status
 from app.crud.user import create_user, get_user_by_email, get_user_by_id, get_all_users, update_user, delete_user, change_password
 from app.crud.notification import (
@@ -28,10 +37,14 @@ from app.crud.notification import (
     delete_old_notification_history,
 )
 from app.crud.ai_report import create_ai_report, list_ai_reports, get_ai_report
+from app.crud.dataset_version import get_dataset_version
 
 __all__ = [
     "create_location",
     "get_locations",
+    "get_locations_near",
+    "get_locations_within",
+    "search_locations",
     "get_location",
     "update_location",
     "delete_location",
@@ -58,4 +71,5 @@ __all__ = [
     "create_ai_report",
     "list_ai_reports",
     "get_ai_report",
+    "get_dataset_version",
 ]
@@ -0,0 +1,24 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import DatasetVersion
+
+
+async def get_dataset_version(db: AsyncSession, name: str) -> int:
+    """Phiên bản hiện tại của bảng `name` (0 nếu chưa từng ghi)."""
+    result = await db.execute(select(DatasetVersion.version).where(DatasetVersion.name == name))
+    return result.scalar() or 0
@@ -12,11 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Optional
+from typing import Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.crud.outbox import DELETE, UPSERT, enqueue_location_sync
 from app.models import GreenLocation, LocationType
 from app.schemas import LocationCreate, LocationUpdate
 from geoalchemy2.elements import WKTElement
@@ -31,6 +32,8 @@ async def create_location(db: AsyncSession, location: LocationCreate) -> GreenLo
         location=wkt_location,
     )
     db.add(db_location)
+    await db.flush()  # cần id cho outbox
+    enqueue_location_sync(db, UPSERT, db_location.location_type, db_location.id)
     await db.commit()
     await db.refresh(db_location)
     return db_location
@@ -49,6 +52,95 @@ async def get_locations(
     result = await db.execute(query)
     return result.scalars().all()
 
+def _geography_point(lat: float, lon: float):
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326))
+
+
+async def get_locations_near(
+    db: AsyncSession,
+    lat: float,
+    lon: float,
+    k: int = 20,
+    radius: Optional[float] = None,
+    location_type: Optional[LocationType] = None,
+) -> list[tuple[GreenLocation, float]]:
+    """
+    k địa điểm gần nhất (kèm khoảng cách, mét), sắp tăng dần.
+    ORDER BY `<->` trên geography dùng chỉ mục GiST idx_green_locations_geog
+    (quét theo thứ tự khoảng cách, dừng sau k dòng); ST_Distance chỉ tính cho
+    k dòng trả về. `radius` (mét) lọc bằng ST_DWithin, cũng qua chỉ mục.
+    """
+    # geography(location) phải trùng biểu thức của chỉ mục để planner dùng được
+    geog = func.geography(GreenLocation.location)
+    ref = _geography_point(lat, lon)
+    query = select(GreenLocation, func.ST_Distance(geog, ref).label("distance_m")).where(
+        GreenLocation.location.isnot(None)
+    )
+    if location_type:
+        query = query.where(GreenLocation.location_type == location_type)
+    if radius is not None:
+        query = query.where(func.ST_DWithin(geog, ref, radius))
+    query = query.order_by(geog.op("<->")(ref)).limit(k)
+    result = await db.execute(query)
+    return [(location, distance) for location, distance in result.all()]
+
+
+async def get_locations_within(
+    db: AsyncSession,
+    bbox: Sequence[float],
+    location_type: Optional[LocationType] = None,
+    limit: int = 500,
+):
+    """Địa điểm trong khung (minLon, minLat, maxLon, maxLat), lọc `&&` qua chỉ mục GiST."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    envelope = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
+    query = select(GreenLocation).where(GreenLocation.location.op("&&")(envelope))
+    if location_type:
+        query = query.where(GreenLocation.location_type == location_type)
+    query = query.order_by(GreenLocation.id).limit(limit)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+def _normalize(value):
+    # Cùng biểu thức với cột name_norm; f_unaccent là IMMUTABLE nên Postgres
+    # tính sẵn với tham số hằng và dùng được chỉ mục trigram
+    return func.lower(func.f_unaccent(value))
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_locations(
+    db: AsyncSession,
+    q: str,
+    limit: int = 20,
+    location_type: Optional[LocationType] = None,
+) -> list[tuple[GreenLocation, float]]:
+    """
+    Tìm theo tên, không phân biệt dấu/hoa thường ("cong vien thong nhat" khớp
+    "Công viên Thống Nhất"). Ứng viên lọc qua chỉ mục trigram GIN trên
+    name_norm: chứa chuỗi con (LIKE) hoặc gần giống theo từ (`<%`, chịu lỗi gõ).
+    Xếp hạng theo word_similarity rồi similarity, kèm điểm 0..1.
+    """
+    query_norm = _normalize(q)
+    pattern = "%" + _normalize(_escape_like(q)) + "%"
+    score = func.word_similarity(query_norm, GreenLocation.name_norm)
+    query = select(GreenLocation, score.label("score")).where(
+        or_(
+            GreenLocation.name_norm.like(pattern, escape="\\"),
+            query_norm.op("<%")(GreenLocation.name_norm),
+        ),
+        GreenLocation.location.isnot(None),
+    )
+    if location_type:
+        query = query.where(GreenLocation.location_type == location_type)
+    query = query.order_by(
+        score.desc(), func.similarity(query_norm, GreenLocation.name_norm).desc(), GreenLocation.id.desc()
+    ).limit(limit)
+    result = await db.execute(query)
+    return [(location, score) for location, score in result.all()]
+
 async def get_location(db: AsyncSession, location_id: int) -> GreenLocation | None:
     result = await db.execute(select(GreenLocation).where(GreenLocation.id == location_id))
     return result.scalar_one_or_none()
@@ -64,10 +156,16 @@ async def update_location(db: AsyncSession, db_obj: GreenLocation, obj_in: Locat
     elif "latitude" in update_data: update_data.pop("latitude")
     elif "longitude" in update_data: update_data.pop("longitude")
 
+    # Đổi loại thì entity id trên Orion cũng đổi: xóa entity cũ
+    old_type = db_obj.location_type
+    if update_data.get("location_type") not in (None, old_type):
+        enqueue_location_sync(db, DELETE, old_type, db_obj.id)
+
     for field, value in update_data.items():
         setattr(db_obj, field, value)
 
     db.add(db_obj)
+    enqueue_location_sync(db, UPSERT, db_obj.location_type, db_obj.id)
     await db.commit()
     await db.refresh(db_obj)
     return db_obj
@@ -75,6 +173,7 @@ async def update_location(db: AsyncSession, db_obj: GreenLocation, obj_in: Locat
 async def delete_location(db: AsyncSession, location_id: int):
     location = await get_location(db, location_id)
     if location:
+        enqueue_location_sync(db, DELETE, location.location_type, location.id)
         await db.delete(location)
         await db.commit()
     return location
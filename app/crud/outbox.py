@@ -0,0 +1,42 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import LocationType, OrionOutbox
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+def location_entity_id(location_type: LocationType | str, location_id: int) -> str:
+    if isinstance(location_type, LocationType):
+        location_type = location_type.value
+    return f"urn:ngsi-ld:{location_type}:{location_id}"
+
+
+def enqueue_location_sync(
+    db: AsyncSession,
+    operation: str,
+    location_type: LocationType | str,
+    location_id: int,
+) -> OrionOutbox:
+    """Thêm việc đồng bộ vào outbox. Không commit: đi chung transaction với thay đổi địa điểm."""
+    entry = OrionOutbox(
+        entity_id=location_entity_id(location_type, location_id),
+        operation=operation,
+        location_id=location_id,
+    )
+    db.add(entry)
+    return entry
@@ -25,6 +25,82 @@ AsyncSessionLocal = async_sessionmaker(
 )
 Base = declarative_base()
 
+# Chạy trước create_all: cột tính toán green_locations.name_norm cần f_unaccent.
+# unaccent() chỉ là STABLE nên bọc lại thành IMMUTABLE để dùng trong cột/chỉ mục.
+SCHEMA_PREREQUISITES = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS $$
+        SELECT public.unaccent('public.unaccent', $1)
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+]
+
+# create_all không thêm cột vào bảng đã tồn tại, các thay đổi schema
+# sau này được áp dụng bằng câu lệnh idempotent ở đây.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE traffic_segments ADD COLUMN IF NOT EXISTS seq integer",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_traffic_segments_seq ON traffic_segments (seq)",
+    "ALTER TABLE traffic_segments ADD COLUMN IF NOT EXISTS vertex_count integer",
+    "CREATE INDEX IF NOT EXISTS idx_green_locations_location ON green_locations USING gist (location)",
+    "CREATE INDEX IF NOT EXISTS idx_green_locations_geog ON green_locations USING gist (geography(location))",
+    "ALTER TABLE green_locations ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_green_locations_updated_at ON green_locations (updated_at)",
+    "ALTER TABLE orion_outbox ADD COLUMN IF NOT EXISTS claimed_until timestamptz",
+    # clock_timestamp() thay vì now(): giảm lệch giữa thời điểm ghi và commit
+    """
+    CREATE OR REPLACE FUNCTION green_locations_touch() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at = clock_timestamp();
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'green_locations_touch') THEN
+            CREATE TRIGGER green_locations_touch BEFORE INSERT OR UPDATE ON green_locations
+            FOR EACH ROW EXECUTE FUNCTION green_locations_touch();
+        END IF;
+    END $$
+    """,
+    "ALTER TABLE green_locations ADD COLUMN IF NOT EXISTS name_norm text "
+    "GENERATED ALWAYS AS (lower(f_unaccent(name))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_green_locations_name_trgm ON green_locations USING gin (name_norm gin_trgm_ops)",
+    # Phiên bản dữ liệu green_locations (bảng dataset_versions): tăng một lần mỗi câu lệnh ghi
+    """
+    CREATE OR REPLACE FUNCTION bump_dataset_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO dataset_versions (name, version, updated_at) VALUES (TG_ARGV[0], 1, now())
+        ON CONFLICT (name) DO UPDATE
+        SET version = dataset_versions.version + 1, updated_at = now();
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'green_locations_version') THEN
+            CREATE TRIGGER green_locations_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON green_locations
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_dataset_version('green_locations');
+        END IF;
+    END $$
+    """,
+    # traffic_segments được nạp lại (TRUNCATE + INSERT) bởi process_simulation.py,
+    # seq có thể đổi: phiên bản này là khóa cache thứ tự seq của traffic_db
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'traffic_segments_version') THEN
+            CREATE TRIGGER traffic_segments_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON traffic_segments
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_dataset_version('traffic_segments');
+        END IF;
+    END $$
+    """,
+]
+
 
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -36,5 +112,9 @@ async def get_db():
 
 async def init_db():
     async with engine.begin() as conn:
+        for statement in SCHEMA_PREREQUISITES:
+            await conn.execute(text(statement))
         await conn.run_sync(Base.metadata.create_all)
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis;"))
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
@@ -15,6 +15,7 @@
 import asyncio
 import logging
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -24,6 +25,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.api import api_router
 from app.core.config import settings
 from app.db.session import init_db
+from app.services.orion import orion
+from app.services.orion_outbox import outbox_drainer
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +36,20 @@ if sys.platform.startswith("win"):
     logger.info("--- [SYSTEM] Đã kích hoạt WindowsSelectorEventLoopPolicy ---")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await orion.start()
+    outbox_drainer.start()
+    try:
+        yield
+    finally:
+        await outbox_drainer.stop()
+        await orion.close()
+
+
 def create_application() -> FastAPI:
-    app = FastAPI(title=settings.project_name)
+    app = FastAPI(title=settings.project_name, lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -48,10 +63,6 @@ def create_application() -> FastAPI:
     static_dir.mkdir(parents=True, exist_ok=True)
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-    @app.on_event("startup")
-    async def on_startup():
-        await init_db()
-
     app.include_router(api_router)
     return app
 
@@ -17,8 +17,11 @@ from app.models.location import GreenLocation
 from app.models.report import UserReport
 from app.models.user import User
 from app.models.notification import NotificationToken, NotificationHistory
-from app.models.traffic import TrafficSegment, SimulationFrame
+from app.models.traffic import TrafficSegment, SimulationFrame, SimulationSlot
 from app.models.ai_report import AIReport
+from app.models.outbox import OrionOutbox
+from app.models.sync_state import SyncState
+from app.models.dataset_version import DatasetVersion
 
 __all__ = [
     "User",
@@ -32,4 +35,8 @@ __all__ = [
     "ReportStatus",
     "TrafficSegment",
     "SimulationFrame",
+    "SimulationSlot",
+    "OrionOutbox",
+    "SyncState",
+    "DatasetVersion",
 ]
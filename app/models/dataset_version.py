@@ -0,0 +1,30 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from sqlalchemy import BigInteger, Column, DateTime, String, func
+
+from app.db.session import Base
+
+
+class DatasetVersion(Base):
+    """
+    Bộ đếm phiên bản của một bảng dữ liệu, tăng sau mỗi câu lệnh
+    INSERT/UPDATE/DELETE/TRUNCATE (trigger bump_dataset_version, xem init_db).
+    Dùng làm ETag và khóa cache cho dữ liệu dẫn xuất.
+    """
+    __tablename__ = "dataset_versions"
+
+    name = Column(String(100), primary_key=True)  # tên bảng, vd. "green_locations", "traffic_segments"
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
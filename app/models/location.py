@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from sqlalchemy import Boolean, Column, Enum, Integer, String, Text
+from sqlalchemy import Boolean, Column, Computed, DateTime, Enum, Integer, String, Text, func
 from geoalchemy2 import Geometry
 
 from app.db.session import Base
@@ -24,10 +24,18 @@ class GreenLocation(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
+    # Tên bỏ dấu, chữ thường ("cong vien thong nhat") cho tìm kiếm; chỉ mục
+    # trigram GIN ix_green_locations_name_trgm (xem init_db)
+    name_norm = Column(Text, Computed("lower(f_unaccent(name))", persisted=True))
     address = Column(String(255), nullable=True)
     description = Column(Text, nullable=True)
     location_type = Column(Enum(LocationType), nullable=False)
-    location = Column(Geometry("POINT", srid=4326))
+    # Chỉ mục GiST idx_green_locations_location (geometry, lọc bbox) do GeoAlchemy2 tạo;
+    # idx_green_locations_geog trên geography(location) cho KNN/bán kính theo mét (xem init_db).
+    location = Column(Geometry("POINT", srid=4326, spatial_index=True))
     is_active = Column(Boolean, default=True)
     data_source = Column(String(100), nullable=True)
     external_id = Column(String(100), nullable=True)
+    # Thời điểm thay đổi cuối, trigger green_locations_touch cập nhật cho mọi UPDATE
+    # (kể cả SQL thuần); sync_to_orion.py chỉ đẩy các dòng mới hơn mốc đã đồng bộ.
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
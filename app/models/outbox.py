@@ -0,0 +1,39 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text, func
+
+from app.db.session import Base
+
+
+class OrionOutbox(Base):
+    """
+    Hàng đợi đồng bộ Postgres -> Orion-LD (transactional outbox).
+    Ghi cùng transaction với thay đổi địa điểm; app/services/orion_outbox.py
+    đọc ra, gửi sang Orion theo lô rồi xóa.
+    """
+    __tablename__ = "orion_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity_id = Column(String(255), nullable=False, index=True)  # urn:ngsi-ld:<type>:<id>
+    operation = Column(String(10), nullable=False)  # "upsert", "delete"
+    # Payload upsert được dựng lúc gửi từ dòng green_locations hiện tại
+    location_id = Column(Integer, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    # Chưa tới thời điểm này thì chưa gửi lại (backoff sau lỗi)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    # Đang được một drainer gửi tới thời điểm này (lease); NULL = chưa ai nhận
+    claimed_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,27 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from sqlalchemy import Column, DateTime, String, func
+
+from app.db.session import Base
+
+
+class SyncState(Base):
+    """Mốc đồng bộ (high-water mark) của các tiến trình đồng bộ tăng dần."""
+    __tablename__ = "sync_state"
+
+    name = Column(String(100), primary_key=True)  # vd. "orion_locations"
+    # updated_at lớn nhất đã đẩy thành công
+    high_water = Column(DateTime(timezone=True), nullable=True)
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
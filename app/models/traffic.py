@@ -12,7 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, LargeBinary
+from sqlalchemy.dialects.postgresql import ARRAY, REAL
 from geoalchemy2 import Geometry
 from app.db.session import Base
 
@@ -20,8 +21,14 @@ class TrafficSegment(Base):
     __tablename__ = "traffic_segments"
     
     id = Column(String, primary_key=True) # ID làn đường (ví dụ: "edge1_0")
-    # Lưu hình học đoạn đường để vẽ lên bản đồ
-    geom = Column(Geometry("LINESTRING", srid=4326))
+    # Lưu hình học đoạn đường để vẽ lên bản đồ.
+    # spatial_index=True: GeoAlchemy2 tạo chỉ mục GiST idx_traffic_segments_geom,
+    # phục vụ lọc khung nhìn (bbox) và vector tile.
+    geom = Column(Geometry("LINESTRING", srid=4326, spatial_index=True))
+    # Khóa thay thế dạng số (0..N-1, theo thứ tự ID) - vị trí của đoạn trong SimulationSlot
+    seq = Column(Integer, unique=True, index=True)
+    # Số đỉnh của geom sau khi đơn giản hóa lúc nạp
+    vertex_count = Column(Integer)
 
 class SimulationFrame(Base):
     __tablename__ = "simulation_frames"
@@ -32,4 +39,17 @@ class SimulationFrame(Base):
     segment_id = Column(String, ForeignKey("traffic_segments.id"), index=True)
     
     avg_speed = Column(Float)
-    status_color = Column(String(10)) # 'green', 'orange', 'red'
\ No newline at end of file
+    status_color = Column(String(10)) # 'green', 'orange', 'red'
+
+class SimulationSlot(Base):
+    """
+    Bố cục lưu trữ nén: một dòng cho mỗi mốc thời gian thay vì một dòng
+    cho mỗi (mốc, đoạn đường). Phần tử thứ i ứng với TrafficSegment.seq = i.
+    """
+    __tablename__ = "simulation_slots"
+
+    time_second = Column(Integer, primary_key=True)
+    # 1 byte mã màu mỗi đoạn (0 = không có dữ liệu, 1 green, 2 orange, 3 red)
+    colors = Column(LargeBinary, nullable=False)
+    # Tốc độ trung bình mỗi đoạn, NULL nếu không có dữ liệu
+    speeds = Column(ARRAY(REAL), nullable=False)
@@ -12,7 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from app.schemas.location import LocationBase, LocationCreate, LocationRead, LocationUpdate
+from app.schemas.location import (
+    LocationBase,
+    LocationCluster,
+    LocationCreate,
+    LocationNearRead,
+    LocationRead,
+    LocationSearchRead,
+    LocationUpdate,
+)
 from app.schemas.news import NewsItem
 from app.schemas.report import ReportBase, ReportCreate, ReportRead, ReportUpdate
 from app.schemas.auth import LoginRequest, TokenResponse
@@ -40,6 +48,9 @@ __all__ = [
     "LocationBase",
     "LocationCreate",
     "LocationRead",
+    "LocationNearRead",
+    "LocationCluster",
+    "LocationSearchRead",
     "LocationUpdate",
     "NewsItem",
     "ReportBase",
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import binascii
+import struct
+from functools import cached_property
 from typing import Any, Optional
 
 from geoalchemy2.shape import to_shape
@@ -20,6 +23,34 @@ from pydantic import BaseModel, ConfigDict, Field, computed_field
 from app.models.enums import LocationType
 
 
+_WKB_POINT = 1
+_EWKB_SRID_FLAG = 0x20000000
+
+
+def point_coordinates(element: Any) -> tuple[float, float] | None:
+    """
+    (lon, lat) của một POINT dạng WKB/EWKB (bytes hoặc hex), đọc thẳng bằng
+    struct thay vì dựng đối tượng shapely. None nếu không phải POINT WKB.
+    """
+    data = getattr(element, "data", None)
+    if isinstance(data, str):
+        try:
+            data = binascii.unhexlify(data)
+        except (binascii.Error, ValueError):
+            return None
+    if not isinstance(data, (bytes, bytearray, memoryview)) or len(data) < 21:
+        return None
+    order = "<" if data[0] == 1 else ">"
+    (wkb_type,) = struct.unpack_from(order + "I", data, 1)
+    # Bỏ cờ Z/M/SRID của EWKB; mã ISO (1001, 2001...) chia 1000 dư 1 vẫn là Point
+    if (wkb_type & 0xFFFF) % 1000 != _WKB_POINT:
+        return None
+    offset = 9 if wkb_type & _EWKB_SRID_FLAG else 5
+    if len(data) < offset + 16:
+        return None
+    return struct.unpack_from(order + "dd", data, offset)
+
+
 class LocationBase(BaseModel):
     name: str
     location_type: LocationType
@@ -46,18 +77,40 @@ class LocationRead(LocationBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+    @cached_property
+    def _lon_lat(self) -> tuple[float, float]:
+        """(lon, lat) giải mã một lần rồi dùng cho cả latitude và longitude."""
+        location = self.location
+        if location is None:
+            return (0.0, 0.0)
+        coordinates = point_coordinates(location)
+        if coordinates is None:
+            # WKT (vd. vừa gán trong crud, chưa đọc lại từ DB) hoặc kiểu hình học khác
+            shape = to_shape(location)
+            coordinates = (shape.x, shape.y)
+        return coordinates
+
     @computed_field
     @property
     def latitude(self) -> float:
-        if self.location:
-            shape = to_shape(self.location)
-            return shape.y
-        return 0.0
+        return self._lon_lat[1]
 
     @computed_field
     @property
     def longitude(self) -> float:
-        if self.location:
-            shape = to_shape(self.location)
-            return shape.x
-        return 0.0
+        return self._lon_lat[0]
+
+
+class LocationNearRead(LocationRead):
+    distance_m: float | None = None
+
+
+class LocationSearchRead(LocationRead):
+    score: float | None = None
+
+
+class LocationCluster(BaseModel):
+    lat: float
+    lon: float
+    count: int
+    location_id: int | None = None
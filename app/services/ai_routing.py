@@ -19,11 +19,12 @@ import re
 from typing import Any, Iterable
 
 import httpx
-from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import crud
 from app.core.config import settings
 from app.models.enums import LocationType
+from app.schemas.location import point_coordinates
 
 DEFAULT_GEOMETRY = {"type": "LineString", "coordinates": []}
 GROQ_CANONICAL_URL = "https://api.groq.com/openai/v1/chat/completions"
@@ -227,26 +228,22 @@ async def _find_location_by_name(db: AsyncSession, keyword: str) -> dict[str, An
     if not keyword:
         return None
 
-    query = text(
-        """
-        SELECT id, name, ST_X(location::geometry) AS lon, ST_Y(location::geometry) AS lat, location_type
-        FROM green_locations
-        WHERE name ILIKE :pattern
-        ORDER BY id DESC
-        LIMIT 1;
-        """
-    )
-    result = await db.execute(query, {"pattern": f"%{keyword}%"})
-    row = result.mappings().first()
-    if not row:
+    # Xếp hạng theo độ giống qua chỉ mục trigram, khớp cả khi thiếu dấu
+    rows = await crud.search_locations(db, keyword, limit=1)
+    if not rows:
         return None
 
+    location, _ = rows[0]
+    coordinates = point_coordinates(location.location)
+    if coordinates is None:
+        return None
+    lon, lat = coordinates
     return {
-        "id": row.get("id"),
-        "name": row.get("name"),
-        "lat": row.get("lat"),
-        "lon": row.get("lon"),
-        "type": row.get("location_type"),
+        "id": location.id,
+        "name": location.name,
+        "lat": lat,
+        "lon": lon,
+        "type": location.location_type.value if location.location_type else None,
     }
 
 
@@ -257,39 +254,25 @@ async def _get_nearest_pois(
     start_lon: float,
     count: int,
 ) -> list[dict[str, Any]]:
-    query = text(
-        """
-        SELECT id, name, ST_X(location::geometry) AS lon, ST_Y(location::geometry) AS lat, location_type,
-               ST_Distance(
-                   location::geography,
-                   ST_SetSRID(ST_MakePoint(:lon_start, :lat_start), 4326)::geography
-               ) AS distance_m
-        FROM green_locations
-        WHERE location_type = :poi_type
-        ORDER BY distance_m
-        LIMIT :limit;
-        """
-    )
-    result = await db.execute(
-        query,
-        {
-            "poi_type": poi_type.value,
-            "lon_start": start_lon,
-            "lat_start": start_lat,
-            "limit": count,
-        },
+    # Cùng đường KNN qua chỉ mục GiST với /locations/near
+    rows = await crud.get_locations_near(
+        db, start_lat, start_lon, k=count, location_type=poi_type
     )
 
     pois: list[dict[str, Any]] = []
-    for row in result.mappings():
+    for location, distance in rows:
+        coordinates = point_coordinates(location.location)
+        if coordinates is None:
+            continue
+        lon, lat = coordinates
         pois.append(
             {
-                "id": row.get("id"),
-                "name": row.get("name"),
-                "lat": row.get("lat"),
-                "lon": row.get("lon"),
-                "type": row.get("location_type") or poi_type.value,
-                "distance": row.get("distance_m"),
+                "id": location.id,
+                "name": location.name,
+                "lat": lat,
+                "lon": lon,
+                "type": location.location_type.value if location.location_type else poi_type.value,
+                "distance": distance,
             }
         )
     return pois
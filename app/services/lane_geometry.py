@@ -0,0 +1,195 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Dựng hình học làn đường từ các điểm GPS của xe.
+
+Các điểm được sắp theo hình chiếu lên trục chính (PCA) của đám điểm - một
+làn SUMO gần như thẳng nên đây chính là chiều xe chạy - thay vì sắp theo kinh
+độ (gây zig-zag ở đường cong/đường dọc). Sau đó đơn giản hóa bằng
+Douglas–Peucker (shapely) để bỏ các đỉnh thừa.
+
+`LanePoints` giữ mẫu điểm của một làn với số điểm tối đa cố định, chọn
+theo hash của tọa độ (tất định) và luôn giữ các điểm đầu mút, nên bộ nhớ khi
+nạp không tăng theo độ dài vết xe và nạp lại cùng dữ liệu cho cùng hình học.
+"""
+
+import heapq
+import math
+from typing import Iterable, Iterator
+
+import numpy as np
+from shapely.geometry import LineString
+
+# Xấp xỉ số mét trên 1 độ (theo vĩ độ); đủ chính xác cho ngưỡng đơn giản hóa
+METERS_PER_DEGREE = 111_320.0
+# Số điểm tối đa giữ cho mỗi làn; thừa sức cho Douglas–Peucker ở sai số ~1 m
+MAX_LANE_POINTS = 4096
+# Hướng (cách nhau 22.5°) để giữ điểm đầu mút; trục chính lệch tối đa 11.25°
+# so với một hướng nên hai đầu của làn (gần thẳng) luôn nằm trong số này
+_DIRECTIONS = tuple((math.cos(math.pi * i / 8), math.sin(math.pi * i / 8)) for i in range(8))
+
+# Số điểm mới gom lại trước khi cập nhật mẫu/đầu mút
+_FLUSH_EVERY = 1024
+
+
+def _priorities(coords: np.ndarray) -> np.ndarray:
+    """
+    Hash 64-bit của từng điểm (mảng (n, 2) float64), tính từ bit của tọa độ
+    (bước trộn splitmix64): ổn định giữa các lần chạy và tiến trình, khác với
+    hash() của Python.
+    """
+    bits = np.ascontiguousarray(coords, dtype=np.float64).view(np.uint64)
+    h = bits[:, 0] * np.uint64(0x9E3779B97F4A7C15) ^ bits[:, 1]
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+class LanePoints:
+    """
+    Mẫu tất định các điểm (lon, lat) không trùng của một làn.
+
+    Giữ `capacity` điểm có hash nhỏ nhất (bottom-k): chưa đầy thì giữ mọi điểm
+    khác nhau (kết quả y như dùng set). Mẫu chỉ phụ thuộc tập điểm, không phụ
+    thuộc thứ tự đọc hay cách chia chunk, nên `merge` cho đúng kết quả như đọc
+    một lượt. Ngoài mẫu, luôn giữ điểm có hình chiếu nhỏ/lớn nhất theo từng
+    hướng trong _DIRECTIONS, để làn không bị ngắn đi ở hai đầu.
+    Điểm mới được gom thành lô _FLUSH_EVERY điểm rồi xử lý bằng NumPy.
+    """
+
+    __slots__ = ("capacity", "_heap", "_members", "_pending", "_low", "_high", "_low_point", "_high_point")
+
+    def __init__(self, capacity: int = MAX_LANE_POINTS):
+        self.capacity = capacity
+        # Max-heap theo (hash, lon, lat) của các điểm đang giữ (lưu giá trị âm)
+        self._heap: list[tuple[int, float, float]] = []
+        self._members: set[tuple[float, float]] = set()
+        self._pending: dict[tuple[float, float], None] = {}
+        # Hình chiếu nhỏ nhất / lớn nhất theo từng hướng và điểm tương ứng
+        self._low = [math.inf] * len(_DIRECTIONS)
+        self._high = [-math.inf] * len(_DIRECTIONS)
+        self._low_point: list[tuple[float, float] | None] = [None] * len(_DIRECTIONS)
+        self._high_point: list[tuple[float, float] | None] = [None] * len(_DIRECTIONS)
+
+    def _extreme_points(self) -> set[tuple[float, float]]:
+        return {point for point in self._low_point + self._high_point if point is not None}
+
+    def points(self) -> list[tuple[float, float]]:
+        """Mẫu cùng các điểm đầu mút (không trùng)."""
+        self._flush()
+        result = list(self._members)
+        result.extend(sorted(self._extreme_points() - self._members))
+        return result
+
+    def __len__(self) -> int:
+        return len(self.points())
+
+    def __iter__(self) -> Iterator[tuple[float, float]]:
+        return iter(self.points())
+
+    def add(self, point: tuple[float, float]) -> None:
+        if point in self._members or point in self._pending:
+            return
+        self._pending[point] = None
+        if len(self._pending) >= _FLUSH_EVERY:
+            self._flush()
+
+    def merge(self, other: "LanePoints") -> None:
+        """Gộp mẫu của `other` (vd. từ chunk khác); kết quả như khi đọc chung một lượt."""
+        other._flush()
+        self._flush()
+        extremes = list(other._extreme_points())
+        self._track_extremes(extremes, np.asarray(extremes, dtype=np.float64))
+        members = list(other._members)
+        self._offer(members, np.asarray(members, dtype=np.float64))
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        points = list(self._pending)
+        self._pending.clear()
+        coords = np.asarray(points, dtype=np.float64)
+        self._track_extremes(points, coords)
+        self._offer(points, coords)
+
+    def _track_extremes(self, points: list[tuple[float, float]], coords: np.ndarray) -> None:
+        if not points:
+            return
+        lons, lats = coords[:, 0], coords[:, 1]
+        for i, (dx, dy) in enumerate(_DIRECTIONS):
+            projection = lons * dx + lats * dy
+            # Hình chiếu bằng nhau thì chọn điểm nhỏ/lớn nhất để không phụ thuộc thứ tự đọc
+            value = float(projection.min())
+            point = min(points[k] for k in np.flatnonzero(projection == value))
+            if value < self._low[i] or (value == self._low[i] and point < self._low_point[i]):
+                self._low[i], self._low_point[i] = value, point
+            value = float(projection.max())
+            point = max(points[k] for k in np.flatnonzero(projection == value))
+            if value > self._high[i] or (value == self._high[i] and point > self._high_point[i]):
+                self._high[i], self._high_point[i] = value, point
+
+    def _offer(self, points: list[tuple[float, float]], coords: np.ndarray) -> None:
+        if not points:
+            return
+        priorities = _priorities(coords)
+        candidates = range(len(points))
+        if len(self._heap) >= self.capacity:
+            # Loại nhanh các điểm có hash lớn hơn điểm lớn nhất đang giữ
+            candidates = np.flatnonzero(priorities <= np.uint64(-self._heap[0][0])).tolist()
+        heap, members = self._heap, self._members
+        for k in candidates:
+            point = points[k]
+            if point in members:
+                continue
+            key = (int(priorities[k]), point[0], point[1])
+            if len(heap) < self.capacity:
+                heapq.heappush(heap, (-key[0], -key[1], -key[2]))
+                members.add(point)
+                continue
+            top = heap[0]
+            if key < (-top[0], -top[1], -top[2]):
+                heapq.heapreplace(heap, (-key[0], -key[1], -key[2]))
+                members.discard((-top[1], -top[2]))
+                members.add(point)
+
+
+def order_points(points: Iterable[tuple[float, float]]) -> np.ndarray:
+    """Mảng (n, 2) các điểm (lon, lat) không trùng, sắp theo trục chính của đám điểm."""
+    coords = np.unique(np.asarray(list(points), dtype=np.float64).reshape(-1, 2), axis=0)
+    if len(coords) < 3:
+        return coords
+
+    # Vĩ độ/kinh độ có tỉ lệ mét khác nhau: quy về cùng tỉ lệ trước khi tính trục
+    scale = np.array([np.cos(np.radians(coords[:, 1].mean())), 1.0])
+    centered = (coords - coords.mean(axis=0)) * scale
+    _, vectors = np.linalg.eigh(centered.T @ centered)
+    projection = centered @ vectors[:, -1]  # vector riêng ứng với trị riêng lớn nhất
+    return coords[np.argsort(projection, kind="stable")]
+
+
+def build_lane_line(
+    points: Iterable[tuple[float, float]], tolerance_m: float = 0.0
+) -> LineString | None:
+    """LINESTRING của làn, đơn giản hóa với sai số tối đa `tolerance_m` mét; None nếu < 2 điểm."""
+    coords = order_points(points)
+    if len(coords) < 2:
+        return None
+    line = LineString(coords)
+    if tolerance_m > 0:
+        line = line.simplify(tolerance_m / METERS_PER_DEGREE, preserve_topology=False)
+    return line
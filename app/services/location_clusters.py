@@ -0,0 +1,103 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Gom cụm địa điểm theo mức zoom (grid snapping) cho /locations/clusters.
+
+Mỗi mức zoom (tối đa MAX_CLUSTER_ZOOM) ứng với một lưới ô vuông cỡ
+GRID_PX pixel màn hình; các điểm cùng ô gộp thành một cụm, tâm cụm là trung
+bình tọa độ các điểm. Cụm của cả thành phố cho từng (zoom, loại) được tính
+một lần bằng GROUP BY trong Postgres rồi giữ trong bộ nhớ theo phiên bản dữ
+liệu green_locations (dataset_versions); request chỉ lọc theo bbox.
+"""
+
+import math
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.core.cache import SWRCache
+from app.db.session import AsyncSessionLocal
+from app.models.enums import LocationType
+from app.services.location_export import DATASET
+
+# Zoom lớn hơn dùng chung lưới của mức này (ô ~37 m, gần như từng điểm)
+MAX_CLUSTER_ZOOM = 18
+# Cạnh ô lưới tính theo pixel của tile 256px
+GRID_PX = 64
+
+# Khóa (phiên bản, zoom, loại): phiên bản đổi thì khóa cũ tự bị đẩy ra theo LRU
+_clusters = SWRCache(ttl=math.inf, maxsize=4 * (MAX_CLUSTER_ZOOM + 1) * (len(LocationType) + 1))
+
+_CLUSTERS_SQL = """
+    SELECT count(*) AS count,
+           avg(ST_X(location)) AS lon,
+           avg(ST_Y(location)) AS lat,
+           min(id) AS location_id
+    FROM green_locations
+    WHERE location IS NOT NULL {type_filter}
+    GROUP BY floor(ST_X(location) / :cell), floor(ST_Y(location) / :cell)
+"""
+
+
+def cell_size(zoom: int) -> float:
+    """Cạnh ô lưới (độ) của một mức zoom."""
+    zoom = max(0, min(zoom, MAX_CLUSTER_ZOOM))
+    return 360.0 * GRID_PX / (256 * 2 ** zoom)
+
+
+async def _compute(zoom: int, location_type: Optional[LocationType]) -> list[dict]:
+    params = {"cell": cell_size(zoom)}
+    type_filter = ""
+    if location_type:
+        type_filter = "AND location_type = :location_type"
+        params["location_type"] = location_type.name
+
+    # Session riêng: kết quả dùng chung cho mọi request, không gắn với request nào
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(text(_CLUSTERS_SQL.format(type_filter=type_filter)), params)
+        return [
+            {
+                "lat": round(row.lat, 6),
+                "lon": round(row.lon, 6),
+                "count": row.count,
+                # Cụm một điểm: kèm ID để client mở chi tiết
+                "location_id": row.location_id if row.count == 1 else None,
+            }
+            for row in result
+        ]
+
+
+async def get_clusters(
+    db: AsyncSession,
+    zoom: int,
+    bbox: Optional[Sequence[float]] = None,
+    location_type: Optional[LocationType] = None,
+) -> list[dict]:
+    """Cụm địa điểm ở mức `zoom`, lọc theo tâm cụm nằm trong `bbox` nếu có."""
+    zoom = min(zoom, MAX_CLUSTER_ZOOM)
+    version = await crud.get_dataset_version(db, DATASET)
+
+    clusters = await _clusters.get_or_load(
+        (version, zoom, location_type), lambda: _compute(zoom, location_type)
+    )
+    if bbox is None:
+        return clusters
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return [
+        c for c in clusters
+        if min_lon <= c["lon"] <= max_lon and min_lat <= c["lat"] <= max_lat
+    ]
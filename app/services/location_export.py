@@ -0,0 +1,133 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Xuất toàn bộ green_locations thành một GeoJSON FeatureCollection dạng stream.
+
+Mỗi Feature được Postgres dựng sẵn thành chuỗi JSON (json_build_object +
+ST_AsGeoJSON) và đọc qua server-side cursor theo từng lô, nên bộ nhớ không
+phụ thuộc số địa điểm. Các lô được nén dần (StreamCompressor) trước khi gửi.
+
+Phiên bản dữ liệu (ETag) và các dòng được đọc trong cùng một transaction
+REPEATABLE READ, nên nội dung gửi đi luôn khớp với ETag của nó.
+"""
+
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app import crud
+from app.core.encoding import StreamCompressor
+from app.db.session import engine
+from app.models.enums import LocationType
+
+DATASET = "green_locations"
+# Số dòng mỗi lần lấy từ cursor
+FETCH_SIZE = 1000
+# Gom tới khoảng này (byte) mới nén và gửi một chunk
+CHUNK_BYTES = 64 * 1024
+
+_FEATURES_SQL = """
+    SELECT json_build_object(
+        'type', 'Feature',
+        'id', id,
+        'geometry', ST_AsGeoJSON(location, 6)::json,
+        'properties', json_build_object(
+            'id', id,
+            'name', name,
+            'location_type', location_type,
+            'description', description,
+            'address', address,
+            'data_source', data_source,
+            'is_active', is_active
+        )
+    )::text AS feature
+    FROM green_locations
+    WHERE location IS NOT NULL {type_filter}
+    ORDER BY id
+"""
+
+
+def etag(version: int, location_type: Optional[LocationType]) -> str:
+    # ETag yếu: cùng nội dung nhưng bản nén có thể khác byte giữa các lần stream
+    suffix = location_type.value if location_type else "all"
+    return f'W/"{DATASET}-{version}-{suffix}"'
+
+
+class FeatureCollectionStream:
+    """
+    FeatureCollection đọc từ một snapshot cố định:
+    `open()` mở transaction REPEATABLE READ và trả về phiên bản dữ liệu của
+    snapshot đó (dùng cho ETag) trước khi response bắt đầu; lặp `async for`
+    sinh các chunk (đã nén theo `encoding`) rồi đóng kết nối.
+    Dùng kết nối riêng thay vì session của request: session từ
+    Depends(get_db) đã đóng trước khi response stream chạy xong.
+    """
+
+    def __init__(self, location_type: Optional[LocationType] = None, encoding: str = "identity"):
+        self.location_type = location_type
+        self.encoding = encoding
+        self._conn: AsyncConnection | None = None
+
+    async def open(self) -> int:
+        conn = await engine.connect()
+        try:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+            await conn.begin()
+            # Câu lệnh đầu tiên chốt snapshot, các dòng đọc sau thấy đúng phiên bản này
+            version = await crud.get_dataset_version(conn, DATASET)
+        except BaseException:
+            await conn.close()
+            raise
+        self._conn = conn
+        return version
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        if self._conn is None:
+            raise RuntimeError("Cần gọi open() trước khi stream")
+        params = {}
+        type_filter = ""
+        if self.location_type:
+            type_filter = "AND location_type = :location_type"
+            params["location_type"] = self.location_type.name
+
+        compressor = StreamCompressor(self.encoding)
+        buffer = bytearray(b'{"type":"FeatureCollection","features":[')
+        first = True
+
+        try:
+            query = text(_FEATURES_SQL.format(type_filter=type_filter)).execution_options(yield_per=FETCH_SIZE)
+            result = await self._conn.stream(query, params)
+            async for rows in result.partitions(FETCH_SIZE):
+                for (feature,) in rows:
+                    if not first:
+                        buffer += b","
+                    buffer += feature.encode("utf-8")
+                    first = False
+                if len(buffer) >= CHUNK_BYTES:
+                    chunk = compressor.compress(bytes(buffer))
+                    buffer.clear()
+                    if chunk:
+                        yield chunk
+        finally:
+            await self.close()
+
+        buffer += b"]}"
+        yield compressor.compress(bytes(buffer)) + compressor.flush()
@@ -12,14 +12,368 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""
+Client Orion-LD dùng chung.
+
+Một `httpx.AsyncClient` (pool kết nối, keep-alive, HTTP/2 khi có `h2` và
+Orion chạy qua TLS) cho cả tiến trình thay vì mở kết nối mới mỗi lần gọi.
+Lời gọi idempotent (GET, DELETE, upsert) được thử lại với backoff có jitter;
+circuit breaker chặn gọi tiếp khi Orion lỗi liên tục để request trả lỗi ngay
+thay vì chờ timeout.
+
+Trong API, `orion` được mở/đóng theo lifespan của FastAPI (app/main.py).
+Script và worker chạy riêng dùng `async with OrionClient() as orion: ...`.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Optional
+
 import httpx
 
 from app.core.config import settings
 from app import models
 
+try:
+    import h2  # noqa: F401  (httpx cần h2 để bật HTTP/2)
+except ImportError:  # pragma: no cover
+    h2 = None
+
+logger = logging.getLogger(__name__)
+
+ENTITIES_PATH = "/ngsi-ld/v1/entities"
+UPSERT_PATH = "/ngsi-ld/v1/entityOperations/upsert"
+WRITE_HEADERS = {"Content-Type": "application/ld+json", "Accept": "application/json"}
+
+# Mã lỗi tạm thời đáng thử lại
+RETRY_STATUS = {429, 502, 503, 504}
+# Orion-LD giới hạn limit tối đa 1000 mỗi trang
+MAX_PAGE_SIZE = 1000
+COUNT_HEADER = "NGSILD-Results-Count"
+
+
+class OrionError(Exception):
+    pass
+
+
+class CircuitOpenError(OrionError):
+    """Orion đang bị ngắt (lỗi liên tục), chưa tới lúc thử lại."""
+
+
+def context_link(context_url: str) -> str:
+    """Giá trị header Link để Orion rút gọn key theo @context."""
+    return f'<{context_url}>; rel="http://www.w3.org/ns/ldp#context"; type="application/ld+json"'
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold lỗi liên tiếp) -> open -> (sau reset_timeout)
+    -> half-open: cho đúng một request thử; thành công thì closed, lỗi thì open lại.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Request bị hủy giữa chừng (không phải lỗi của Orion): trả lượt thử half-open."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class OrionClient:
+    def __init__(
+        self,
+        base_url: str | None = None,
+        *,
+        max_connections: int | None = None,
+        timeout: float | None = None,
+        retries: int | None = None,
+        backoff: float = 0.2,
+        http2: bool | None = None,
+        breaker: CircuitBreaker | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.base_url = (base_url or settings.orion_broker_url).rstrip("/")
+        self.max_connections = max_connections or settings.orion_max_connections
+        self.timeout = timeout or settings.orion_timeout
+        self.retries = settings.orion_retries if retries is None else retries
+        self.backoff = backoff
+        self.http2 = (settings.orion_http2 if http2 is None else http2) and h2 is not None
+        self.breaker = breaker or CircuitBreaker()
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    # --- Vòng đời ---
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0,
+                ),
+                transport=self._transport,
+            )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "OrionClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    # --- Gửi request ---
+
+    def _retry_delay(self, attempt: int) -> float:
+        # Full jitter: ngẫu nhiên trong [0, backoff * 2^attempt]
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    async def request(
+        self, method: str, path: str, *, idempotent: bool = False, **kwargs: Any
+    ) -> httpx.Response:
+        """
+        Gửi request tới Orion. Lỗi kết nối/timeout và mã 429/502/503/504 được
+        thử lại tối đa `retries` lần nếu `idempotent`. Trả về response cuối cùng
+        (không raise theo mã HTTP); raise CircuitOpenError hoặc httpx.TransportError.
+        """
+        if self._client is None:
+            await self.start()
+
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Orion tạm thời bị ngắt sau nhiều lỗi liên tiếp ({self.base_url})")
+
+            # Mọi nhánh đều phải báo kết quả cho breaker, nếu không lượt thử
+            # half-open bị giữ mãi và mọi lời gọi sau đều bị ngắt
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except httpx.TransportError as exc:
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning("Orion %s %s lỗi (%s), thử lại lần %d", method, path, exc, attempt + 1)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except BaseException:
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code >= 500 or response.status_code == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRY_STATUS or attempt + 1 >= attempts:
+                    return response
+                logger.warning(
+                    "Orion %s %s trả về %d, thử lại lần %d", method, path, response.status_code, attempt + 1
+                )
+
+            await asyncio.sleep(self._retry_delay(attempt))
+        raise AssertionError("unreachable")
+
+    # --- Helper theo kiểu thao tác ---
+
+    async def upsert_entities(
+        self, entities: list[dict], *, update: bool = True, timeout: float | None = None
+    ) -> httpx.Response:
+        """Batch upsert (idempotent). `update=True` -> options=update (giữ thuộc tính không gửi)."""
+        response = await self.request(
+            "POST",
+            UPSERT_PATH,
+            idempotent=True,
+            params={"options": "update"} if update else None,
+            json=entities,
+            headers=WRITE_HEADERS,
+            timeout=timeout or self.timeout,
+        )
+        response.raise_for_status()
+        return response
+
+    async def create_entity(self, entity: dict) -> httpx.Response:
+        """POST /entities (không idempotent, không thử lại). Trả response để caller xử lý 409..."""
+        return await self.request("POST", ENTITIES_PATH, json=entity, headers=WRITE_HEADERS)
+
+    async def query_entities(
+        self,
+        params: dict[str, Any],
+        *,
+        context: Optional[str] = None,
+        accept: str = "application/ld+json",
+    ) -> list[dict]:
+        """GET /entities. 404 (chưa có entity nào của type) trả về []."""
+        headers = self._query_headers(context, accept)
+        response = await self.request("GET", ENTITIES_PATH, idempotent=True, params=params, headers=headers)
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        return response.json()
+
+    def _query_headers(self, context: Optional[str], accept: str) -> dict[str, str]:
+        headers = {"Accept": accept}
+        if context:
+            headers["Link"] = context_link(context)
+        return headers
+
+    async def count_entities(self, params: dict[str, Any], *, context: Optional[str] = None) -> int:
+        """Tổng số entity khớp `params` (count=true, limit=0: Orion không trả dữ liệu)."""
+        response = await self.request(
+            "GET",
+            ENTITIES_PATH,
+            idempotent=True,
+            params={**params, "count": "true", "limit": 0},
+            headers=self._query_headers(context, "application/json"),
+        )
+        if response.status_code == 404:
+            return 0
+        response.raise_for_status()
+        return int(response.headers.get(COUNT_HEADER, 0))
+
+    async def iter_entity_pages(
+        self,
+        params: dict[str, Any],
+        *,
+        context: Optional[str] = None,
+        accept: str = "application/ld+json",
+        page_size: int = MAX_PAGE_SIZE,
+        concurrency: int | None = None,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Toàn bộ entity khớp `params`, theo từng trang đúng thứ tự offset.
+        Lấy tổng bằng count=true rồi tải các trang song song, tối đa
+        `concurrency` trang cùng lúc; trang chỉ được tải trước khi cần tới
+        tối đa `concurrency` trang nên bộ nhớ có giới hạn.
+        """
+        concurrency = concurrency or settings.orion_page_concurrency
+        page_size = min(page_size, MAX_PAGE_SIZE)
+        total = await self.count_entities(params, context=context)
+        offsets = iter(range(0, total, page_size))
+
+        def fetch(offset: int) -> asyncio.Task:
+            page_params = {**params, "limit": page_size, "offset": offset}
+            return asyncio.ensure_future(self.query_entities(page_params, context=context, accept=accept))
+
+        window: deque[asyncio.Task] = deque()
+        try:
+            for offset in offsets:
+                window.append(fetch(offset))
+                if len(window) >= concurrency:
+                    break
+            while window:
+                page = await window.popleft()
+                offset = next(offsets, None)
+                if offset is not None:
+                    window.append(fetch(offset))
+                yield page
+        finally:
+            # Client ngắt kết nối hoặc lỗi giữa chừng: hủy các trang đang tải
+            for task in window:
+                task.cancel()
+
+    async def delete_entity(self, entity_id: str) -> bool:
+        """Xóa entity (idempotent). Trả về False nếu entity không tồn tại."""
+        response = await self.request(
+            "DELETE", f"{ENTITIES_PATH}/{entity_id}", idempotent=True, headers={"Accept": "application/json"}
+        )
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+
+# Client dùng chung của API, mở/đóng theo lifespan (app/main.py)
+orion = OrionClient()
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def stream_entities(
+    pages: AsyncIterator[list[dict]],
+    transform: Callable[[dict], dict] | None = None,
+    envelope: dict[str, Any] | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Ghép các trang thành một JSON stream: mảng entity, hoặc nếu có `envelope`
+    thì `{**envelope, "data": [...], "count": n}` (count đặt cuối vì chỉ biết
+    sau khi gửi xong). Trang đầu (kèm count=true) được tải trước khi trả về
+    để lỗi Orion còn trả được mã lỗi HTTP thay vì một stream bị cắt.
+    """
+    first = await anext(pages, [])
+
+    async def body() -> AsyncIterator[bytes]:
+        count = 0
+        if envelope is None:
+            yield b"["
+        else:
+            yield _dumps(envelope)[:-1] + (b',"data":[' if envelope else b'"data":[')
+        page = first
+        while True:
+            chunk = bytearray()
+            for item in page:
+                if transform is not None:
+                    item = transform(item)
+                if count:
+                    chunk += b","
+                chunk += _dumps(item)
+                count += 1
+            if chunk:
+                yield bytes(chunk)
+            page = await anext(pages, None)
+            if page is None:
+                break
+        yield b"]" if envelope is None else b'],"count":' + str(count).encode() + b"}"
+
+    return body()
+
 
 async def push_report_to_orion(report: models.UserReport):
-    orion_url = f"{settings.orion_broker_url}/ngsi-ld/v1/entities"
     entity_id = f"urn:ngsi-ld:CivicIssue:Hanoi:{report.id}"
 
     payload = {
@@ -41,8 +395,5 @@ async def push_report_to_orion(report: models.UserReport):
     if report.image_url:
         payload["image"] = {"type": "Property", "value": report.image_url}
 
-    headers = {"Content-Type": "application/ld+json"}
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(orion_url, json=payload, headers=headers)
-        response.raise_for_status()
+    response = await orion.create_entity(payload)
+    response.raise_for_status()
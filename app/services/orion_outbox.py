@@ -0,0 +1,282 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đồng bộ địa điểm Postgres -> Orion-LD ở nền (write-behind).
+
+API chỉ ghi một dòng `orion_outbox` trong cùng transaction với thay đổi địa
+điểm (app/crud/location.py), không chờ Orion. `OutboxDrainer` đọc outbox theo
+lô và gửi đi:
+
+- Nhiều dòng của cùng một entity được gộp (coalesce): chỉ thao tác mới nhất
+  được gửi, payload upsert dựng từ dòng green_locations hiện tại.
+- Mọi upsert trong lô đi chung một lời gọi entityOperations/upsert; DELETE
+  gửi song song qua pool của OrionClient.
+- Lỗi thì giữ lại dòng, tăng `attempts` và hoãn (`available_at`) theo backoff
+  lũy thừa có jitter - không mất thay đổi khi Orion gặp sự cố.
+
+Mỗi lô đi qua hai transaction ngắn, lời gọi Orion (có retry/backoff) chạy
+khi không mở transaction nào:
+
+1. Nhận (claim): đặt `claimed_until` (lease) cho các dòng tới hạn và dựng
+   payload upsert, rồi commit.
+2. Gửi sang Orion.
+3. Hoàn tất: xóa dòng đã gửi, hoãn dòng lỗi, bỏ lease.
+
+Mỗi tiến trình API chạy một drainer (lifespan). Bước nhận giữ advisory lock
+của transaction và bỏ qua entity đang có dòng được drainer khác giữ, nên mỗi
+entity chỉ có một lô đang gửi - giữ đúng thứ tự thao tác của từng entity.
+Drainer chết giữa chừng thì lease hết hạn (ORION_OUTBOX_LEASE) và dòng được
+nhận lại.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, schemas
+from app.core.config import settings
+from app.crud.outbox import DELETE, UPSERT
+from app.db.session import AsyncSessionLocal
+from app.services.orion import OrionClient, orion
+
+logger = logging.getLogger(__name__)
+
+# Khóa pg_try_advisory_xact_lock dành riêng cho outbox
+OUTBOX_LOCK_KEY = 0x6F72696F6E  # "orion"
+# Backoff lần lỗi đầu tiên (giây), tăng gấp đôi mỗi lần tới ORION_OUTBOX_MAX_BACKOFF
+_BASE_BACKOFF = 2.0
+
+
+def location_entity(location: models.GreenLocation) -> dict:
+    """Entity NGSI-LD của một địa điểm (cùng định dạng sync_to_orion.py)."""
+    loc_data = schemas.LocationRead.model_validate(location)
+    payload = {
+        "id": f"urn:ngsi-ld:{loc_data.location_type.value}:{loc_data.id}",
+        "type": loc_data.location_type.value,
+        "name": {"type": "Property", "value": loc_data.name},
+        "location": {
+            "type": "GeoProperty",
+            "value": {"type": "Point", "coordinates": [loc_data.longitude, loc_data.latitude]},
+        },
+        "source": {"type": "Property", "value": "Admin Created"},
+        "@context": settings.ngsi_context_transportation,
+    }
+    if loc_data.description:
+        payload["description"] = {"type": "Property", "value": loc_data.description}
+    return payload
+
+
+def _batch_errors(response) -> dict[str, str]:
+    """Entity lỗi trong phản hồi 207 Multi-Status của batch upsert."""
+    if response.status_code != 207:
+        return {}
+    try:
+        errors = response.json().get("errors", [])
+    except ValueError:
+        return {}
+    return {
+        item.get("entityId"): str(item.get("error") or "Multi-Status")
+        for item in errors
+        if item.get("entityId")
+    }
+
+
+class OutboxDrainer:
+    def __init__(
+        self,
+        client: OrionClient,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        batch_size: int | None = None,
+        interval: float | None = None,
+        max_backoff: float | None = None,
+    ):
+        self._client = client
+        self._session_factory = session_factory
+        self.batch_size = batch_size or settings.orion_outbox_batch
+        self.interval = interval or settings.orion_outbox_interval
+        self.max_backoff = max_backoff or settings.orion_outbox_max_backoff
+        self.lease = timedelta(seconds=settings.orion_outbox_lease)
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # Gọi sau mỗi lô có entity được gửi thành công (vd. xóa cache đọc từ Orion)
+        self.on_synced: list[Callable[[], None]] = []
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.max_backoff, _BASE_BACKOFF * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _upsert_entities(
+        self, db: AsyncSession, entries: list[models.OrionOutbox]
+    ) -> list[dict]:
+        if not entries:
+            return []
+        ids = [entry.location_id for entry in entries]
+        result = await db.execute(select(models.GreenLocation).where(models.GreenLocation.id.in_(ids)))
+        # Địa điểm đã bị xóa sau khi vào outbox: bỏ qua, dòng delete theo sau sẽ xử lý
+        return [location_entity(location) for location in result.scalars()]
+
+    async def _send_upserts(self, entities: list[dict], failed: dict[str, str]) -> None:
+        if not entities:
+            return
+        try:
+            response = await self._client.upsert_entities(entities)
+        except Exception as exc:  # pylint: disable=broad-except
+            failed.update({entity["id"]: str(exc) for entity in entities})
+            return
+        failed.update(_batch_errors(response))
+
+    async def _send_deletes(self, entity_ids: list[str], failed: dict[str, str]) -> None:
+        results = await asyncio.gather(
+            *(self._client.delete_entity(entity_id) for entity_id in entity_ids),
+            return_exceptions=True,
+        )
+        for entity_id, result in zip(entity_ids, results):
+            if isinstance(result, Exception):
+                failed[entity_id] = str(result)
+
+    async def _claim(self) -> tuple[dict[str, tuple[int, str]], list[dict], int] | None:
+        """
+        Transaction 1: nhận một lô dòng tới hạn (đặt lease) và dựng payload upsert.
+        Trả về ({entity_id: (id dòng mới nhất, thao tác)}, entity upsert, số dòng),
+        None nếu trống hoặc drainer khác đang nhận.
+        """
+        outbox = models.OrionOutbox
+        async with self._session_factory() as db:
+            async with db.begin():
+                locked = await db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": OUTBOX_LOCK_KEY}
+                )
+                if not locked.scalar():
+                    return None
+
+                now = datetime.now(timezone.utc)
+                in_flight = select(outbox.entity_id).where(outbox.claimed_until > now)
+                result = await db.execute(
+                    select(outbox)
+                    .where(outbox.available_at <= now, outbox.entity_id.not_in(in_flight))
+                    .order_by(outbox.id)
+                    .limit(self.batch_size)
+                )
+                rows = result.scalars().all()
+                if not rows:
+                    return None
+
+                await db.execute(
+                    update(outbox)
+                    .where(outbox.id.in_([row.id for row in rows]))
+                    .values(claimed_until=now + self.lease)
+                )
+
+                # Gộp theo entity: giữ dòng mới nhất
+                latest: dict[str, models.OrionOutbox] = {}
+                for row in rows:
+                    latest[row.entity_id] = row
+                entities = await self._upsert_entities(
+                    db, [row for row in latest.values() if row.operation == UPSERT]
+                )
+                claimed = {entity_id: (row.id, row.operation) for entity_id, row in latest.items()}
+                return claimed, entities, len(rows)
+
+    async def _complete(self, claimed: dict[str, tuple[int, str]], failed: dict[str, str]) -> None:
+        """Transaction 3: xóa dòng đã gửi, hoãn dòng lỗi theo backoff và bỏ lease."""
+        outbox = models.OrionOutbox
+        now = datetime.now(timezone.utc)
+        async with self._session_factory() as db:
+            async with db.begin():
+                # Xóa mọi dòng đã được thay thế hoặc đã gửi xong (kể cả dòng cũ
+                # hơn đang chờ backoff của cùng entity); dòng lỗi được giữ để thử lại.
+                for entity_id, (row_id, _) in claimed.items():
+                    stale = delete(outbox).where(outbox.entity_id == entity_id)
+                    if entity_id not in failed:
+                        await db.execute(stale.where(outbox.id <= row_id))
+                        continue
+                    await db.execute(stale.where(outbox.id < row_id))
+                    row = await db.get(outbox, row_id)
+                    if row is None:
+                        continue
+                    row.attempts += 1
+                    row.last_error = failed[entity_id][:1000]
+                    row.available_at = now + timedelta(seconds=self._retry_delay(row.attempts))
+                    row.claimed_until = None
+
+    async def drain_once(self) -> int:
+        """Xử lý một lô. Trả về số dòng outbox đã đọc (0 = trống hoặc drainer khác đang nhận)."""
+        batch = await self._claim()
+        if batch is None:
+            return 0
+        claimed, entities, row_count = batch
+
+        # Gửi khi không giữ transaction/kết nối DB nào
+        failed: dict[str, str] = {}
+        await self._send_upserts(entities, failed)
+        await self._send_deletes(
+            [entity_id for entity_id, (_, operation) in claimed.items() if operation == DELETE], failed
+        )
+
+        await self._complete(claimed, failed)
+
+        if len(failed) < len(claimed):
+            for callback in self.on_synced:
+                callback()
+        if failed:
+            logger.warning(
+                "Đồng bộ Orion lỗi %d/%d entity, sẽ thử lại: %s",
+                len(failed), len(claimed), next(iter(failed.values())),
+            )
+        return row_count
+
+    # --- Vòng lặp nền ---
+
+    def notify(self) -> None:
+        """Đánh thức drainer ngay sau khi ghi outbox (không chờ hết chu kỳ)."""
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.drain_once()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("Không xử lý được outbox Orion: %s", exc)
+                processed = 0
+            # Lô đầy: còn việc, chạy tiếp ngay
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Drainer của API, chạy theo lifespan (app/main.py)
+outbox_drainer = OutboxDrainer(orion)
@@ -0,0 +1,43 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đồng hồ mô phỏng giao thông dùng chung.
+
+Thời gian mô phỏng chỉ phụ thuộc đồng hồ hệ thống và cấu hình
+(SIMULATION_EPOCH, SIMULATION_PLAYBACK_RATE), không phụ thuộc lúc tiến trình
+khởi động, nên mọi worker/máy chủ (đồng bộ NTP) cùng phục vụ một frame.
+"""
+
+import time
+
+from app.core.config import settings
+from app.services.traffic_store import DATA_INTERVAL, LOOP_DURATION
+
+
+def playback_rate() -> float:
+    return settings.simulation_playback_rate
+
+
+def elapsed() -> float:
+    """Số giây mô phỏng đã trôi qua kể từ SIMULATION_EPOCH."""
+    return (time.time() - settings.simulation_epoch) * settings.simulation_playback_rate
+
+
+def current_second(
+    interval: int = DATA_INTERVAL, loop_duration: int = LOOP_DURATION
+) -> tuple[int, int]:
+    """(giây mô phỏng trong vòng lặp, mốc dữ liệu đã làm tròn xuống theo interval)."""
+    raw_second = int(elapsed()) % loop_duration
+    return raw_second, (raw_second // interval) * interval
@@ -0,0 +1,302 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đọc file vết xe mô phỏng theo kiểu streaming: bản ghi được sinh lần lượt,
+không nạp cả file vào bộ nhớ.
+
+Hỗ trợ:
+- JSON array `[{...}, {...}]` (định dạng gốc, kể cả có indent)
+- NDJSON / JSON Lines: mỗi dòng một object (.ndjson, .jsonl)
+- Định dạng chunk: thư mục gồm `manifest.json` và các file NDJSON nén zstd
+  (`chunk-00000.ndjson.zst`...), mỗi chunk đọc được độc lập nên có thể xử lý
+  song song. Tạo bằng `write_chunked_trace` (xem Data/convert_trace.py).
+
+`SpeedAggregator` gom tốc độ trung bình theo (giây, làn) bằng NumPy, xử lý
+từng khối cột thay vì từng dòng Python; bộ nhớ của nó tỉ lệ với số cặp
+(giây, làn) khác nhau chứ không với số dòng vết xe.
+"""
+
+import io
+import json
+import os
+from typing import IO, Iterable, Iterator
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - chỉ cần khi dùng định dạng chunk
+    zstandard = None
+
+from app.services.traffic_store import COLOR_CODES
+
+READ_CHUNK_SIZE = 1 << 20  # 1MB
+
+MANIFEST_FILE = "manifest.json"
+TRACE_FORMAT = "greenmap-trace"
+TRACE_FORMAT_VERSION = 1
+ROWS_PER_CHUNK = 500_000
+ZSTD_LEVEL = 3
+
+# Ngưỡng tốc độ trung bình (km/h): < 5 đỏ, < 20 cam, còn lại xanh
+RED_BELOW = 5
+ORANGE_BELOW = 20
+
+# Khóa gộp = (giây << 32) | chỉ số làn
+_LANE_BITS = 32
+
+_WHITESPACE = " \t\r\n"
+
+
+def _iter_json_array(f: IO[str]) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # Bỏ khoảng trắng và dấu phân cách giữa các phần tử
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE + ",[]":
+            if buffer[pos] == "[":
+                started = True
+            elif buffer[pos] == "]" and started:
+                return
+            pos += 1
+
+        if pos >= len(buffer):
+            if eof:
+                return
+            chunk = f.read(READ_CHUNK_SIZE)
+            buffer, pos = chunk, 0
+            eof = not chunk
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Phần tử bị cắt ngang giữa 2 chunk: đọc thêm rồi thử lại
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        pos = end
+        yield item
+
+
+def _iter_json_lines(f: IO[str]) -> Iterator[dict]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _require_zstd() -> None:
+    if zstandard is None:
+        raise RuntimeError("Cần cài 'zstandard' để đọc/ghi định dạng chunk (pip install zstandard)")
+
+
+def is_chunked_trace(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE)) or os.path.basename(path) == MANIFEST_FILE
+
+
+def read_manifest(path: str) -> dict:
+    """Đọc manifest của thư mục chunk (nhận cả đường dẫn thư mục lẫn manifest.json)."""
+    manifest_path = path if os.path.basename(path) == MANIFEST_FILE else os.path.join(path, MANIFEST_FILE)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != TRACE_FORMAT or manifest.get("version") != TRACE_FORMAT_VERSION:
+        raise ValueError(f"Manifest không hợp lệ: {manifest_path}")
+    return manifest
+
+
+def chunk_paths(path: str) -> list[str]:
+    """Đường dẫn tuyệt đối các chunk theo thứ tự trong manifest."""
+    base = os.path.dirname(path) if os.path.basename(path) == MANIFEST_FILE else path
+    return [os.path.join(base, chunk["file"]) for chunk in read_manifest(path)["chunks"]]
+
+
+def iter_chunk_records(path: str) -> Iterator[dict]:
+    """Sinh bản ghi của một chunk NDJSON nén zstd (giải nén dạng stream)."""
+    _require_zstd()
+    with open(path, "rb") as raw:
+        reader = zstandard.ZstdDecompressor().stream_reader(raw)
+        yield from _iter_json_lines(io.TextIOWrapper(reader, encoding="utf-8"))
+
+
+def iter_trace_records(path: str) -> Iterator[dict]:
+    """Sinh lần lượt từng bản ghi vết xe trong file (hoặc thư mục chunk)."""
+    if is_chunked_trace(path):
+        for chunk_path in chunk_paths(path):
+            yield from iter_chunk_records(chunk_path)
+        return
+    if path.endswith(".zst"):
+        yield from iter_chunk_records(path)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            yield from _iter_json_lines(f)
+        else:
+            yield from _iter_json_array(f)
+
+
+def write_chunked_trace(
+    records: Iterable[dict],
+    out_dir: str,
+    rows_per_chunk: int = ROWS_PER_CHUNK,
+    level: int = ZSTD_LEVEL,
+) -> dict:
+    """
+    Ghi bản ghi vết xe ra thư mục chunk (NDJSON + zstd) và trả về manifest.
+    Manifest được ghi cuối cùng (qua file tạm) nên thư mục chỉ hợp lệ khi đã ghi xong.
+    """
+    _require_zstd()
+    os.makedirs(out_dir, exist_ok=True)
+    compressor = zstandard.ZstdCompressor(level=level)
+    chunks: list[dict] = []
+    writer = raw = None
+    rows = 0
+
+    def close_chunk():
+        writer.close()  # đóng luôn file bên dưới
+        chunks[-1]["rows"] = rows
+        chunks[-1]["bytes"] = os.path.getsize(os.path.join(out_dir, chunks[-1]["file"]))
+
+    try:
+        for record in records:
+            if writer is None or rows >= rows_per_chunk:
+                if writer is not None:
+                    close_chunk()
+                name = f"chunk-{len(chunks):05d}.ndjson.zst"
+                chunks.append({"file": name})
+                raw = open(os.path.join(out_dir, name), "wb")
+                writer = compressor.stream_writer(raw)
+                rows = 0
+            writer.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            writer.write(b"\n")
+            rows += 1
+        if writer is not None:
+            close_chunk()
+            writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+    manifest = {
+        "format": TRACE_FORMAT,
+        "version": TRACE_FORMAT_VERSION,
+        "compression": "zstd",
+        "rows": sum(chunk["rows"] for chunk in chunks),
+        "chunks": chunks,
+    }
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return manifest
+
+
+def speed_colors(avg_speeds: np.ndarray) -> np.ndarray:
+    """Mã màu (theo traffic_store.COLOR_CODES) cho mảng tốc độ trung bình."""
+    return np.select(
+        [avg_speeds < RED_BELOW, avg_speeds < ORANGE_BELOW],
+        [COLOR_CODES["red"], COLOR_CODES["orange"]],
+        default=COLOR_CODES["green"],
+    ).astype(np.uint8)
+
+
+class SpeedAggregator:
+    """
+    Group-by (giây, làn) -> tổng/số mẫu tốc độ, dạng cột.
+
+    Mỗi khối được gom bằng sort (np.unique) + np.bincount; kết quả từng phần
+    được gộp lại định kỳ nên bộ nhớ chỉ tỉ lệ với số cặp (giây, làn) khác nhau,
+    không phụ thuộc số dòng vết xe.
+    """
+
+    def __init__(self, compact_every: int = 8):
+        self._keys: list[np.ndarray] = []
+        self._sums: list[np.ndarray] = []
+        self._counts: list[np.ndarray] = []
+        self._compact_every = compact_every
+
+    def add(self, times, lanes, speeds) -> None:
+        times = np.asarray(times, dtype=np.int64)
+        lanes = np.asarray(lanes, dtype=np.int64)
+        speeds = np.asarray(speeds, dtype=np.float64)
+        if not len(times):
+            return
+
+        keys = (times << _LANE_BITS) | lanes
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        self._keys.append(unique_keys)
+        self._sums.append(np.bincount(inverse, weights=speeds, minlength=len(unique_keys)))
+        self._counts.append(np.bincount(inverse, minlength=len(unique_keys)))
+
+        if len(self._keys) >= self._compact_every:
+            self._compact()
+
+    def add_partial(self, times, lanes, sums, counts) -> None:
+        """Gộp kết quả từng phần (tổng, số mẫu) của một SpeedAggregator khác, ví dụ từ tiến trình con."""
+        keys = (np.asarray(times, dtype=np.int64) << _LANE_BITS) | np.asarray(lanes, dtype=np.int64)
+        if not len(keys):
+            return
+        # Khóa của một phần là duy nhất nhưng có thể mất thứ tự sau khi đánh lại chỉ số làn
+        order = np.argsort(keys, kind="stable")
+        self._keys.append(keys[order])
+        self._sums.append(np.asarray(sums, dtype=np.float64)[order])
+        self._counts.append(np.asarray(counts, dtype=np.int64)[order])
+
+        if len(self._keys) >= self._compact_every:
+            self._compact()
+
+    def partial(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(giây, chỉ số làn, tổng tốc độ, số mẫu) hiện có, dùng với `add_partial`."""
+        self._compact()
+        if not self._keys:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty.astype(np.float64), empty
+        keys = self._keys[0]
+        return keys >> _LANE_BITS, keys & ((1 << _LANE_BITS) - 1), self._sums[0], self._counts[0]
+
+    def _compact(self) -> None:
+        if len(self._keys) <= 1:
+            return
+        keys = np.concatenate(self._keys)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=np.concatenate(self._sums), minlength=len(unique_keys))
+        counts = np.bincount(inverse, weights=np.concatenate(self._counts), minlength=len(unique_keys))
+        self._keys = [unique_keys]
+        self._sums = [sums]
+        self._counts = [counts.astype(np.int64)]
+
+    def result(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Trả về (giây, chỉ số làn, tốc độ trung bình, mã màu), sắp theo (giây, làn)."""
+        self._compact()
+        if not self._keys:
+            empty = np.empty(0)
+            return empty.astype(np.int64), empty.astype(np.int64), empty, empty.astype(np.uint8)
+
+        keys, sums, counts = self._keys[0], self._sums[0], self._counts[0]
+        avg_speeds = sums / counts
+        return (
+            keys >> _LANE_BITS,
+            keys & ((1 << _LANE_BITS) - 1),
+            avg_speeds,
+            speed_colors(avg_speeds),
+        )
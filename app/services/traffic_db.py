@@ -0,0 +1,306 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đọc trạng thái giao thông từ Postgres (đường dự phòng khi chưa có kho frame).
+
+Hai bố cục bảng (TRAFFIC_FRAME_LAYOUT):
+- rows: `simulation_frames`, một dòng cho mỗi (giây, đoạn đường)
+- packed: `simulation_slots`, một dòng cho mỗi giây; `colors` là bytea mã màu
+  theo thứ tự `traffic_segments.seq`
+- both: ghi cả hai, đọc từ packed
+"""
+
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.core.config import settings
+from app.services import traffic_store
+
+LAYOUTS = ("rows", "packed", "both")
+
+_ENVELOPE = "ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)"
+
+# Tên trong dataset_versions, tăng mỗi lần traffic_segments được ghi (trigger, xem init_db)
+SEGMENTS_DATASET = "traffic_segments"
+
+# (phiên bản, danh sách segment id theo seq)
+_segment_order: tuple[tuple[str, int], list[str]] | None = None
+
+
+def frame_layouts() -> set[str]:
+    """Các bảng frame cần ghi theo cấu hình: {"rows"}, {"packed"} hoặc cả hai."""
+    layout = settings.traffic_frame_layout.lower()
+    if layout not in LAYOUTS:
+        raise ValueError(f"TRAFFIC_FRAME_LAYOUT không hợp lệ: {layout!r} (chọn {', '.join(LAYOUTS)})")
+    return {"rows", "packed"} if layout == "both" else {layout}
+
+
+def _bbox_params(bbox: Sequence[float]) -> dict[str, float]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return {"min_lon": min_lon, "min_lat": min_lat, "max_lon": max_lon, "max_lat": max_lat}
+
+
+async def segment_order(db: AsyncSession) -> list[str]:
+    """
+    ID đoạn đường theo seq (vị trí trong `simulation_slots.colors`), cache theo
+    phiên bản dữ liệu: dataset_version của kho frame nếu có, không thì phiên
+    bản traffic_segments trong Postgres (đổi ngay khi nạp lại, seq có thể đổi).
+    """
+    global _segment_order
+    store = traffic_store.get_frame_store()
+    if store is not None:
+        version = ("store", store.dataset_version)
+    else:
+        version = ("db", await crud.get_dataset_version(db, SEGMENTS_DATASET))
+    if _segment_order is not None and _segment_order[0] == version:
+        return _segment_order[1]
+
+    # Dữ liệu nạp trước khi có cột seq: thứ tự theo ID, giống kho frame
+    result = await db.execute(
+        text("SELECT id FROM traffic_segments ORDER BY seq NULLS LAST, id")
+    )
+    order = [str(row[0]) for row in result]
+    _segment_order = (version, order)
+    return order
+
+
+async def _query_rows(
+    db: AsyncSession, query_second: int, bbox: Optional[Sequence[float]]
+) -> dict[str, str]:
+    if bbox is None:
+        query = """
+            SELECT segment_id, status_color
+            FROM simulation_frames
+            WHERE time_second = :sec
+        """
+        result = await db.execute(text(query), {"sec": query_second})
+    else:
+        query = f"""
+            SELECT f.segment_id, f.status_color
+            FROM simulation_frames f
+            JOIN traffic_segments s ON s.id = f.segment_id
+            WHERE f.time_second = :sec
+              AND s.geom && {_ENVELOPE}
+        """
+        result = await db.execute(text(query), {"sec": query_second, **_bbox_params(bbox)})
+    return {str(row.segment_id): row.status_color for row in result.mappings()}
+
+
+async def _query_packed(
+    db: AsyncSession, query_second: int, bbox: Optional[Sequence[float]]
+) -> dict[str, str]:
+    result = await db.execute(
+        text("SELECT colors FROM simulation_slots WHERE time_second = :sec"),
+        {"sec": query_second},
+    )
+    colors = result.scalar()
+    if colors is None:
+        return {}
+
+    order = await segment_order(db)
+    if bbox is None:
+        indices = range(min(len(order), len(colors)))
+    else:
+        result = await db.execute(
+            text(f"SELECT seq FROM traffic_segments WHERE seq IS NOT NULL AND geom && {_ENVELOPE}"),
+            _bbox_params(bbox),
+        )
+        indices = sorted(seq for (seq,) in result if seq < len(colors))
+
+    names = traffic_store.COLOR_NAMES
+    return {order[i]: names[colors[i]] for i in indices if colors[i]}
+
+
+async def _segment_positions(db: AsyncSession, bbox: Optional[Sequence[float]]) -> list[int]:
+    """Vị trí (theo segment_order) của các đoạn đường trong khung nhìn."""
+    order = await segment_order(db)
+    if bbox is None:
+        return list(range(len(order)))
+    result = await db.execute(
+        text(f"SELECT id FROM traffic_segments WHERE geom && {_ENVELOPE}"),
+        _bbox_params(bbox),
+    )
+    inside = {str(row[0]) for row in result}
+    return [i for i, segment_id in enumerate(order) if segment_id in inside]
+
+
+async def query_frames(
+    db: AsyncSession, seconds: Sequence[int], bbox: Optional[Sequence[float]] = None
+) -> tuple[list[str], list[bytes]]:
+    """
+    Nhiều mốc giây trong một truy vấn. Trả về (ID đoạn đường, mã màu từng mốc):
+    byte thứ i của mỗi mốc là mã màu (traffic_store.COLOR_CODES, 0 = không có
+    dữ liệu) của đoạn đường thứ i.
+    """
+    order = await segment_order(db)
+    positions = await _segment_positions(db, bbox)
+    rows: dict[int, bytes] = {}
+
+    if "packed" in frame_layouts():
+        result = await db.execute(
+            text("SELECT time_second, colors FROM simulation_slots WHERE time_second = ANY(:secs)"),
+            {"secs": sorted(set(seconds))},
+        )
+        rows = {row.time_second: bytes(row.colors) for row in result}
+    else:
+        result = await db.execute(
+            text("""
+                SELECT time_second, segment_id, status_color
+                FROM simulation_frames
+                WHERE time_second = ANY(:secs)
+            """),
+            {"secs": sorted(set(seconds))},
+        )
+        position_of = {segment_id: i for i, segment_id in enumerate(order)}
+        codes = traffic_store.COLOR_CODES
+        buffers: dict[int, bytearray] = {}
+        for row in result:
+            i = position_of.get(str(row.segment_id))
+            code = codes.get(row.status_color)
+            if i is None or code is None:
+                continue
+            buffer = buffers.get(row.time_second)
+            if buffer is None:
+                buffer = buffers[row.time_second] = bytearray(len(order))
+            buffer[i] = code
+        rows = {second: bytes(buffer) for second, buffer in buffers.items()}
+
+    frames = []
+    for second in seconds:
+        row = rows.get(second, b"")
+        frames.append(bytes(row[i] if i < len(row) else 0 for i in positions))
+    return [order[i] for i in positions], frames
+
+
+async def query_timelines(
+    db: AsyncSession, segment_ids: Sequence[str]
+) -> dict[str, tuple[list[float | None], list[str | None]]]:
+    """Chuỗi (tốc độ, màu) qua mọi slot của vòng lặp cho từng đoạn đường tồn tại."""
+    if "packed" in frame_layouts():
+        query = """
+            SELECT t.id AS segment_id, s.time_second,
+                   s.speeds[t.seq + 1] AS avg_speed,
+                   get_byte(s.colors, t.seq) AS code
+            FROM simulation_slots s
+            CROSS JOIN traffic_segments t
+            WHERE t.id = ANY(:ids) AND t.seq IS NOT NULL
+        """
+    else:
+        query = """
+            SELECT f.segment_id, f.time_second, f.avg_speed, f.status_color
+            FROM simulation_frames f
+            WHERE f.segment_id = ANY(:ids)
+        """
+    result = await db.execute(text(query), {"ids": list(segment_ids)})
+    existing = await db.execute(
+        text("SELECT id FROM traffic_segments WHERE id = ANY(:ids)"), {"ids": list(segment_ids)}
+    )
+
+    slot_count = traffic_store.LOOP_DURATION // traffic_store.DATA_INTERVAL
+    timelines = {
+        str(row[0]): ([None] * slot_count, [None] * slot_count) for row in existing
+    }
+    names = traffic_store.COLOR_NAMES
+    for row in result.mappings():
+        timeline = timelines.get(str(row["segment_id"]))
+        second = row["time_second"]
+        if timeline is None or second % traffic_store.DATA_INTERVAL:
+            continue
+        slot = (second % traffic_store.LOOP_DURATION) // traffic_store.DATA_INTERVAL
+        color = names[row["code"]] if "code" in row else row["status_color"]
+        speed = row["avg_speed"]
+        timeline[0][slot] = None if speed is None else round(speed, 2)
+        timeline[1][slot] = color
+    return timelines
+
+
+async def query_summaries(
+    db: AsyncSession, seconds: Sequence[int], top: int = traffic_store.TOP_SLOWEST
+) -> dict[int, dict]:
+    """
+    Tổng hợp từng mốc giây (giống FrameStore.summary) tính trực tiếp trong
+    Postgres - chỉ dùng khi chưa có kho frame, chi phí tỉ lệ số dòng frame.
+    """
+    params = {"secs": sorted(set(seconds)), "top": top}
+    if "packed" in frame_layouts():
+        source = """
+            SELECT s.time_second, t.id AS segment_id,
+                   s.speeds[t.seq + 1] AS avg_speed,
+                   get_byte(s.colors, t.seq) AS code
+            FROM simulation_slots s
+            CROSS JOIN traffic_segments t
+            WHERE s.time_second = ANY(:secs) AND t.seq IS NOT NULL
+        """
+    else:
+        source = """
+            SELECT time_second, segment_id, avg_speed,
+                   CASE status_color WHEN 'green' THEN 1 WHEN 'orange' THEN 2
+                                     WHEN 'red' THEN 3 ELSE 0 END AS code
+            FROM simulation_frames
+            WHERE time_second = ANY(:secs)
+        """
+    result = await db.execute(
+        text(f"""
+            WITH frames AS ({source}),
+            totals AS (
+                SELECT time_second,
+                       count(*) FILTER (WHERE code = 1) AS green,
+                       count(*) FILTER (WHERE code = 2) AS orange,
+                       count(*) FILTER (WHERE code = 3) AS red,
+                       avg(avg_speed) AS mean_speed
+                FROM frames
+                GROUP BY time_second
+            ),
+            ranked AS (
+                SELECT time_second, segment_id, avg_speed,
+                       row_number() OVER (PARTITION BY time_second ORDER BY avg_speed, segment_id) AS rank
+                FROM frames
+                WHERE avg_speed IS NOT NULL
+            )
+            SELECT t.*, r.segment_id, r.avg_speed
+            FROM totals t
+            LEFT JOIN ranked r ON r.time_second = t.time_second AND r.rank <= :top
+            ORDER BY t.time_second, r.rank
+        """),
+        params,
+    )
+
+    summaries: dict[int, dict] = {}
+    for row in result.mappings():
+        summary = summaries.get(row["time_second"])
+        if summary is None:
+            mean_speed = row["mean_speed"]
+            summary = summaries[row["time_second"]] = {
+                "counts": {"green": row["green"], "orange": row["orange"], "red": row["red"]},
+                "mean_speed": None if mean_speed is None else round(float(mean_speed), 2),
+                "slowest": [],
+            }
+        if row["segment_id"] is not None:
+            summary["slowest"].append(
+                {"segment_id": str(row["segment_id"]), "speed": round(float(row["avg_speed"]), 2)}
+            )
+    return summaries
+
+
+async def query_status(
+    db: AsyncSession, query_second: int, bbox: Optional[Sequence[float]] = None
+) -> dict[str, str]:
+    """Trạng thái {segment_id: màu} tại một mốc giây, lọc theo bbox nếu có."""
+    if "packed" in frame_layouts():
+        return await _query_packed(db, query_second, bbox)
+    return await _query_rows(db, query_second, bbox)
@@ -0,0 +1,128 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+GeoJSON bản đồ nền giao thông, dựng sẵn một lần và nén sẵn (gzip, brotli).
+
+Hình học chỉ đổi khi `process_simulation.py` chạy lại, nên payload được giữ
+trong bộ nhớ theo `traffic_store.cache_version()`.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.encoding import brotli, pick_encoding
+from app.services import traffic_store
+
+
+class EncodedPayload:
+    """Một payload JSON kèm các bản nén và ETag mạnh tương ứng."""
+
+    def __init__(self, raw: bytes):
+        self.digest = hashlib.sha256(raw).hexdigest()[:32]
+        self.bodies: dict[str, bytes] = {"identity": raw}
+        self.bodies["gzip"] = gzip.compress(raw, compresslevel=9)
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(raw, quality=11)
+
+    def etag(self, encoding: str) -> str:
+        # Mỗi bản mã hóa là một representation riêng nên có ETag riêng
+        if encoding == "identity":
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{encoding}"'
+
+    def matches(self, if_none_match: str | None) -> bool:
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-")[0] == self.digest:
+                return True
+        return False
+
+    def pick_encoding(self, accept_encoding: str | None) -> str:
+        return pick_encoding(accept_encoding, [e for e in ("br", "gzip") if e in self.bodies])
+
+
+_payload: EncodedPayload | None = None
+_payload_version: tuple[str, int] | None = None
+_lock = asyncio.Lock()
+
+
+async def build_feature_collection(
+    db: AsyncSession, bbox: Sequence[float] | None = None
+) -> bytes:
+    """FeatureCollection dạng bytes; lọc theo bbox qua chỉ mục GiST nếu có."""
+    query = """
+        SELECT
+            id,
+            ST_AsGeoJSON(ST_Simplify(geom, 0.0001), 6) as geometry
+        FROM traffic_segments
+    """
+    params = {}
+    if bbox is not None:
+        query += " WHERE geom && ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)"
+        params = dict(zip(("min_lon", "min_lat", "max_lon", "max_lat"), bbox))
+    result = await db.execute(text(query), params)
+
+    # ST_AsGeoJSON đã trả về JSON hợp lệ, ghép thẳng chuỗi thay vì json.loads rồi dumps lại
+    features = []
+    for row in result.mappings():
+        if not row.geometry:
+            continue
+        segment_id = json.dumps(str(row.id), ensure_ascii=False)
+        segment_name = json.dumps(f"Đoạn đường {row.id}", ensure_ascii=False)
+        features.append(
+            f'{{"type":"Feature","id":{segment_id},"geometry":{row.geometry},'
+            f'"properties":{{"id":{segment_id},"name":{segment_name}}}}}'
+        )
+
+    raw = '{"type":"FeatureCollection","features":[' + ",".join(features) + "]}"
+    return raw.encode("utf-8")
+
+
+async def _build(db: AsyncSession) -> EncodedPayload:
+    raw = await build_feature_collection(db)
+    # Nén brotli mức cao khá tốn CPU, chạy ngoài event loop
+    return await asyncio.to_thread(EncodedPayload, raw)
+
+
+def _is_fresh(version: tuple[str, int]) -> bool:
+    return _payload is not None and _payload_version == version
+
+
+async def get_segments_payload(db: AsyncSession) -> EncodedPayload:
+    global _payload, _payload_version  # pylint: disable=global-statement
+
+    version = traffic_store.cache_version()
+    if _is_fresh(version):
+        return _payload
+
+    async with _lock:
+        # Request khác có thể đã dựng xong trong lúc chờ lock
+        if _is_fresh(version):
+            return _payload
+        payload = await _build(db)
+        _payload, _payload_version = payload, version
+        return payload
@@ -0,0 +1,493 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Kho frame giao thông dạng nhị phân (memory-mapped).
+
+`process_simulation.py` ghi file này một lần lúc nạp dữ liệu. Mỗi worker
+uvicorn mmap file ở chế độ chỉ đọc nên page cache của hệ điều hành được
+dùng chung, `/traffic/live` không cần truy vấn Postgres.
+
+Bố cục file (little-endian):
+    HEADER  : magic, version, số section, DATA_INTERVAL, LOOP_DURATION,
+              số slot, số đoạn đường, dataset_version
+    TOC     : mỗi section gồm (tên 8 byte, offset, độ dài)
+    sections: "segments" - danh sách ID đoạn đường (UTF-8, ngăn cách "\\n")
+              "colors"   - ma trận slot x đoạn đường, mỗi ô 1 byte mã màu
+              "diffs"    - với mỗi slot s: chỉ số các đoạn đường đổi màu so với
+                           slot s-1 (slot 0 so với slot cuối, tức vòng lặp).
+                           Gồm bảng offset (slot + 1) u32 rồi mảng chỉ số u32.
+              "bounds"   - bbox (minLon, minLat, maxLon, maxLat) float32 của
+                           từng đoạn đường, dùng dựng lưới ô cho lọc khung nhìn
+              "speeds"   - (tùy chọn) ma trận đoạn đường x slot float32 tốc độ
+                           trung bình, NaN = không có dữ liệu. Mỗi đoạn đường là
+                           một dải liên tục để đọc chuỗi thời gian không cần gom.
+              "summary"  - (chỉ khi có "speeds") tổng hợp từng slot: số đoạn xanh/cam/đỏ,
+                           tốc độ trung bình toàn mạng, TOP_SLOWEST đoạn chậm
+                           nhất (chỉ số u32, 0xFFFFFFFF = trống; tốc độ float32)
+"""
+
+import heapq
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Iterable, Mapping, Sequence
+
+from app.core.config import settings
+
+# Cấu hình mô phỏng
+LOOP_DURATION = 3600
+DATA_INTERVAL = 10
+
+MAGIC = b"GMTF"
+FORMAT_VERSION = 3
+
+# 0 = không có dữ liệu tại slot đó (đường SQL cũng không trả về đoạn này)
+COLOR_NAMES = (None, "green", "orange", "red")
+COLOR_CODES = {name: code for code, name in enumerate(COLOR_NAMES) if name}
+
+_HEADER = struct.Struct("<4sHHIIIIQ")
+_SECTION = struct.Struct("<8sQQ")
+
+# Số đoạn đường chậm nhất lưu sẵn cho mỗi slot
+TOP_SLOWEST = 10
+_SUMMARY = struct.Struct(f"<3If{TOP_SLOWEST}I{TOP_SLOWEST}f")
+_NO_SEGMENT = 0xFFFFFFFF
+
+# Kích thước ô lưới (độ) cho chỉ mục đoạn đường -> ô, khoảng 1km ở Hà Nội
+GRID_CELL_SIZE = 0.01
+
+# Client tụt lại quá số slot này (hoặc quá nửa số đoạn đổi màu) thì gửi snapshot đầy đủ
+MAX_DELTA_SLOTS = 30
+
+# Không có kho frame thì cache dữ liệu dẫn xuất chỉ sống trong khoảng này
+FALLBACK_CACHE_TTL = 300
+
+# Khoảng thời gian tối thiểu giữa 2 lần stat() file để phát hiện dữ liệu mới
+_STAT_INTERVAL = 5.0
+
+
+class FrameStore:
+    """Đọc kho frame qua mmap, không sao chép dữ liệu."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = os.fstat(f.fileno())
+
+        (
+            magic,
+            version,
+            section_count,
+            self.interval,
+            self.loop_duration,
+            self.slot_count,
+            self.segment_count,
+            self.dataset_version,
+        ) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"File kho frame không hợp lệ: {path}")
+
+        self._view = memoryview(self._mmap)
+        self._sections: dict[str, memoryview] = {}
+        for i in range(section_count):
+            raw_name, offset, length = _SECTION.unpack_from(
+                self._mmap, _HEADER.size + i * _SECTION.size
+            )
+            name = raw_name.rstrip(b"\0").decode("ascii")
+            self._sections[name] = self._view[offset : offset + length]
+
+        segments = bytes(self._sections["segments"]).decode("utf-8")
+        self.segment_ids: tuple[str, ...] = tuple(segments.split("\n")) if segments else ()
+        self._colors = self._sections["colors"]
+
+        diffs = self._sections["diffs"]
+        offsets_size = (self.slot_count + 1) * 4
+        self._diff_offsets = diffs[:offsets_size].cast("I")
+        self._diff_indices = diffs[offsets_size:].cast("I")
+
+        self._bounds = self._sections["bounds"].cast("f")
+        self._grid = self._build_grid()
+        # Phạm vi dữ liệu (minLon, minLat, maxLon, maxLat), dùng để cắt khung nhìn
+        self._extent = (
+            (min(self._bounds[0::4]), min(self._bounds[1::4]), max(self._bounds[2::4]), max(self._bounds[3::4]))
+            if self.segment_count
+            else None
+        )
+
+        speeds = self._sections.get("speeds")
+        self._speeds = speeds.cast("f") if speeds is not None else None
+        self._index: dict[str, int] | None = None
+        self._summary = self._sections.get("summary")
+
+    @property
+    def has_speeds(self) -> bool:
+        return self._speeds is not None
+
+    def index_of(self, segment_id: str) -> int | None:
+        if self._index is None:
+            self._index = {sid: i for i, sid in enumerate(self.segment_ids)}
+        return self._index.get(segment_id)
+
+    @property
+    def has_summary(self) -> bool:
+        # File cũ có thể có summary dựng khi chưa có speeds (mean/slowest rỗng)
+        return self._summary is not None and self._speeds is not None
+
+    def summary(self, slot: int) -> dict:
+        """Tổng hợp dựng sẵn của một slot (đọc một bản ghi cố định, O(1))."""
+        values = _SUMMARY.unpack_from(self._summary, slot * _SUMMARY.size)
+        green, orange, red, mean_speed = values[:4]
+        indices = values[4 : 4 + TOP_SLOWEST]
+        speeds = values[4 + TOP_SLOWEST :]
+        segment_ids = self.segment_ids
+        return {
+            "counts": {"green": green, "orange": orange, "red": red},
+            "mean_speed": None if mean_speed != mean_speed else round(mean_speed, 2),
+            "slowest": [
+                {"segment_id": segment_ids[i], "speed": round(speed, 2)}
+                for i, speed in zip(indices, speeds)
+                if i != _NO_SEGMENT
+            ],
+        }
+
+    def timeline(self, index: int) -> tuple[list[float | None], list[str | None]]:
+        """Tốc độ (None nếu không có) và màu của một đoạn đường qua mọi slot của vòng lặp."""
+        row = self._colors[index :: self.segment_count].tolist() if self.segment_count else []
+        names = COLOR_NAMES
+        colors = [names[code] for code in row]
+        if self._speeds is None:
+            return [None] * self.slot_count, colors
+        start = index * self.slot_count
+        speeds = [
+            None if value != value else round(value, 2)
+            for value in self._speeds[start : start + self.slot_count].tolist()
+        ]
+        return speeds, colors
+
+    def _build_grid(self) -> dict[tuple[int, int], list[int]]:
+        """Chỉ mục ô lưới -> các đoạn đường có bbox chạm ô đó (dựng một lần mỗi worker)."""
+        grid: dict[tuple[int, int], list[int]] = {}
+        bounds = self._bounds
+        for i in range(self.segment_count):
+            min_lon, min_lat, max_lon, max_lat = bounds[i * 4 : i * 4 + 4]
+            for cx in range(_cell(min_lon), _cell(max_lon) + 1):
+                for cy in range(_cell(min_lat), _cell(max_lat) + 1):
+                    grid.setdefault((cx, cy), []).append(i)
+        return grid
+
+    def segments_in_bbox(self, bbox: Sequence[float]) -> list[int]:
+        """Chỉ số (tăng dần) các đoạn đường có bbox giao với khung nhìn."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        extent = self._extent
+        if extent is None:
+            return []
+        # Chỉ duyệt phần khung nhìn nằm trong phạm vi dữ liệu
+        x0, x1 = _cell(max(min_lon, extent[0])), _cell(min(max_lon, extent[2]))
+        y0, y1 = _cell(max(min_lat, extent[1])), _cell(min(max_lat, extent[3]))
+        if x0 > x1 or y0 > y1:
+            return []
+
+        bounds = self._bounds
+        grid = self._grid
+        candidates: set[int] = set()
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(grid):
+            # Khung nhìn phủ nhiều ô hơn số ô có dữ liệu: duyệt các ô của lưới
+            for (cx, cy), cell in grid.items():
+                if x0 <= cx <= x1 and y0 <= cy <= y1:
+                    candidates.update(cell)
+        else:
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    candidates.update(grid.get((cx, cy), ()))
+        return sorted(
+            i
+            for i in candidates
+            if bounds[i * 4] <= max_lon
+            and bounds[i * 4 + 2] >= min_lon
+            and bounds[i * 4 + 1] <= max_lat
+            and bounds[i * 4 + 3] >= min_lat
+        )
+
+    def slot_for(self, second: int) -> int:
+        return (second % self.loop_duration) // self.interval
+
+    def colors(self, slot: int) -> memoryview:
+        """Hàng mã màu của một slot (view trỏ thẳng vào mmap)."""
+        start = slot * self.segment_count
+        return self._colors[start : start + self.segment_count]
+
+    def status(self, slot: int, indices: Sequence[int] | None = None) -> dict[str, str]:
+        names = COLOR_NAMES
+        row = self.colors(slot)
+        if indices is not None:
+            segment_ids = self.segment_ids
+            return {segment_ids[i]: names[row[i]] for i in indices if row[i]}
+        return {
+            segment_id: names[code]
+            for segment_id, code in zip(self.segment_ids, row)
+            if code
+        }
+
+    def frames(self, slots: Sequence[int], indices: Sequence[int] | None = None) -> list[bytes]:
+        """Mã màu của nhiều slot, mỗi slot một chuỗi byte theo thứ tự `indices` (hoặc mọi đoạn)."""
+        if indices is None:
+            return [bytes(self.colors(slot)) for slot in slots]
+        return [bytes(map(self.colors(slot).__getitem__, indices)) for slot in slots]
+
+    def changes(
+        self, since_slot: int, slot: int, indices: Sequence[int] | None = None
+    ) -> dict[str, str | None] | None:
+        """
+        Các đoạn đường đổi màu từ `since_slot` tới `slot` (tính cả vòng lặp),
+        giới hạn trong `indices` nếu có.
+        Màu None nghĩa là đoạn đường không còn dữ liệu.
+        Trả về None khi client tụt lại quá xa, lúc đó nên gửi snapshot đầy đủ.
+        """
+        steps = (slot - since_slot) % self.slot_count
+        if steps > MAX_DELTA_SLOTS:
+            return None
+
+        offsets = self._diff_offsets
+        diff_indices = self._diff_indices
+        changed: set[int] = set()
+        for step in range(1, steps + 1):
+            s = (since_slot + step) % self.slot_count
+            changed.update(diff_indices[offsets[s] : offsets[s + 1]])
+            if len(changed) > self.segment_count // 2:
+                return None
+
+        if indices is not None:
+            changed.intersection_update(indices)
+
+        row = self.colors(slot)
+        names = COLOR_NAMES
+        segment_ids = self.segment_ids
+        return {segment_ids[i]: names[row[i]] for i in sorted(changed)}
+
+
+def _cell(value: float) -> int:
+    return math.floor(value / GRID_CELL_SIZE)
+
+
+def _build_diffs(colors: bytearray, slot_count: int, segment_count: int) -> bytes:
+    offsets = array("I", [0])
+    indices = array("I")
+    for slot in range(slot_count):
+        prev_start = ((slot - 1) % slot_count) * segment_count
+        start = slot * segment_count
+        prev_row = colors[prev_start : prev_start + segment_count]
+        row = colors[start : start + segment_count]
+        if prev_row != row:
+            indices.extend(i for i in range(segment_count) if prev_row[i] != row[i])
+        offsets.append(len(indices))
+    return offsets.tobytes() + indices.tobytes()
+
+
+def _build_speeds(
+    speeds: Mapping[int, Mapping[str, float]],
+    index: Mapping[str, int],
+    slot_count: int,
+    interval: int,
+    loop_duration: int,
+) -> array:
+    matrix = array("f", [math.nan]) * (len(index) * slot_count)
+    for second, lanes in speeds.items():
+        if second % interval or not 0 <= second < loop_duration:
+            continue
+        slot = second // interval
+        for segment_id, value in lanes.items():
+            i = index.get(segment_id)
+            if i is not None:
+                matrix[i * slot_count + slot] = value
+    return matrix
+
+
+def _build_summary(colors: bytearray, speeds: array, slot_count: int, segment_count: int) -> bytes:
+    out = bytearray(slot_count * _SUMMARY.size)
+    for slot in range(slot_count):
+        row = colors[slot * segment_count : (slot + 1) * segment_count]
+        counts = [row.count(COLOR_CODES[name]) for name in ("green", "orange", "red")]
+
+        # speeds theo từng đoạn đường: phần tử của slot cách nhau slot_count
+        column = speeds[slot::slot_count]
+        present = [(value, i) for i, value in enumerate(column) if value == value]
+        mean_speed = sum(v for v, _ in present) / len(present) if present else math.nan
+        slowest = heapq.nsmallest(TOP_SLOWEST, present)
+        padding = TOP_SLOWEST - len(slowest)
+
+        _SUMMARY.pack_into(
+            out,
+            slot * _SUMMARY.size,
+            *counts,
+            mean_speed,
+            *([i for _, i in slowest] + [_NO_SEGMENT] * padding),
+            *([v for v, _ in slowest] + [0.0] * padding),
+        )
+    return bytes(out)
+
+
+def write_frame_store(
+    path: str,
+    segment_ids: Iterable[str],
+    frames: Mapping[int, Mapping[str, str]],
+    bounds: Mapping[str, Sequence[float]],
+    interval: int = DATA_INTERVAL,
+    loop_duration: int = LOOP_DURATION,
+    speeds: Mapping[int, Mapping[str, float]] | None = None,
+) -> int:
+    """
+    Ghi kho frame từ `frames[time_second][segment_id] = màu`,
+    `bounds[segment_id] = (minLon, minLat, maxLon, maxLat)` và (tùy chọn)
+    `speeds[time_second][segment_id] = tốc độ trung bình`.
+    Trả về dataset_version của file vừa ghi.
+    """
+    segment_ids = list(segment_ids)
+    index = {segment_id: i for i, segment_id in enumerate(segment_ids)}
+    segment_count = len(segment_ids)
+    slot_count = loop_duration // interval
+
+    colors = bytearray(slot_count * segment_count)
+    for second, lanes in frames.items():
+        if second % interval or not 0 <= second < loop_duration:
+            continue
+        base = (second // interval) * segment_count
+        for segment_id, color in lanes.items():
+            i = index.get(segment_id)
+            if i is not None:
+                colors[base + i] = COLOR_CODES.get(color, 0)
+
+    speed_matrix = None
+    if speeds is not None:
+        speed_matrix = _build_speeds(speeds, index, slot_count, interval, loop_duration)
+    return write_frame_matrices(
+        path, segment_ids, colors, [bounds[sid] for sid in segment_ids], interval, loop_duration, speed_matrix
+    )
+
+
+def write_frame_matrices(
+    path: str,
+    segment_ids: Sequence[str],
+    colors,
+    bounds: Iterable[Sequence[float]],
+    interval: int = DATA_INTERVAL,
+    loop_duration: int = LOOP_DURATION,
+    speeds=None,
+) -> int:
+    """
+    Ghi kho frame từ ma trận dựng sẵn (bytes-like hoặc mảng NumPy liền bộ nhớ):
+    `colors` slot x đoạn đường (uint8, mã màu), `speeds` (tùy chọn) đoạn
+    đường x slot (float32, NaN = không có), `bounds` theo thứ tự `segment_ids`.
+    Ghi ra file tạm rồi `os.replace` để worker đang đọc không thấy file dở dang.
+    Trả về dataset_version của file vừa ghi.
+    """
+    segment_count = len(segment_ids)
+    slot_count = loop_duration // interval
+    colors = bytearray(colors)
+    if len(colors) != slot_count * segment_count:
+        raise ValueError("Kích thước ma trận màu không khớp số slot x số đoạn đường")
+
+    sections = [
+        (b"segments", "\n".join(segment_ids).encode("utf-8")),
+        (b"colors", bytes(colors)),
+        (b"diffs", _build_diffs(colors, slot_count, segment_count)),
+        (b"bounds", array("f", (v for box in bounds for v in box)).tobytes()),
+    ]
+    speed_matrix = None
+    if speeds is not None:
+        speed_matrix = array("f", bytes(speeds))
+        if len(speed_matrix) != slot_count * segment_count:
+            raise ValueError("Kích thước ma trận tốc độ không khớp số đoạn đường x số slot")
+        sections.append((b"speeds", speed_matrix.tobytes()))
+        # Không có tốc độ thì bỏ summary: /traffic/summary sẽ gom từ Postgres
+        sections.append((b"summary", _build_summary(colors, speed_matrix, slot_count, segment_count)))
+    dataset_version = time.time_ns()
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(sections),
+        interval,
+        loop_duration,
+        slot_count,
+        segment_count,
+        dataset_version,
+    )
+
+    offset = _HEADER.size + len(sections) * _SECTION.size
+    toc = b""
+    for name, payload in sections:
+        toc += _SECTION.pack(name, offset, len(payload))
+        offset += len(payload)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(toc)
+        for _, payload in sections:
+            f.write(payload)
+    os.replace(tmp_path, path)
+    return dataset_version
+
+
+_store: FrameStore | None = None
+_checked_at = 0.0
+
+
+def get_frame_store() -> FrameStore | None:
+    """
+    Trả về kho frame của worker hiện tại (None nếu chưa có file).
+    Tự nạp lại khi `process_simulation.py` ghi file mới.
+    """
+    global _store, _checked_at  # pylint: disable=global-statement
+
+    now = time.monotonic()
+    if now - _checked_at < _STAT_INTERVAL:
+        return _store
+    _checked_at = now
+
+    path = settings.traffic_store_path
+    try:
+        stat = os.stat(path)
+    except OSError:
+        _store = None
+        return None
+
+    if _store is not None and (
+        _store.stat.st_ino == stat.st_ino and _store.stat.st_mtime_ns == stat.st_mtime_ns
+    ):
+        return _store
+
+    try:
+        _store = FrameStore(path)
+    except (OSError, ValueError, KeyError, struct.error):
+        _store = None
+    return _store
+
+
+def cache_version() -> tuple[str, int]:
+    """
+    Phiên bản dữ liệu giao thông để đưa vào khóa cache.
+    Có kho frame thì dùng dataset_version (đổi mỗi lần nạp lại), không có thì
+    dùng mốc thời gian theo FALLBACK_CACHE_TTL để cache tự hết hạn.
+    """
+    store = get_frame_store()
+    if store is not None:
+        return ("store", store.dataset_version)
+    return ("ttl", int(time.time() // FALLBACK_CACHE_TTL))
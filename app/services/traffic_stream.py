@@ -0,0 +1,160 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Phát (fan-out) frame giao thông cho /traffic/stream.
+
+Mỗi worker có một ticker duy nhất: mỗi mốc DATA_INTERVAL nó tính frame một
+lần, serialize sẵn (JSON cho WebSocket, khung SSE) rồi đánh thức mọi
+subscriber. Subscriber không có hàng đợi riêng, chỉ giữ số thứ tự frame đã
+gửi: client chậm sẽ bỏ qua các frame trung gian và nhận snapshot mới nhất,
+nên bộ nhớ mỗi kết nối là hằng số.
+"""
+
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable
+
+from app.services.traffic_store import DATA_INTERVAL, LOOP_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Chờ thêm một chút sau mốc để chắc chắn đã sang slot mới
+_TICK_GRACE = 0.05
+# Thử lại sau bao lâu nếu nạp frame lỗi (DB mất kết nối...)
+_RETRY_DELAY = 2.0
+
+
+class Frame:
+    __slots__ = ("seq", "time_query", "full_json", "delta_json", "full_sse", "delta_sse")
+
+    def __init__(self, seq: int, time_query: int, full_json: str, delta_json: str | None):
+        self.seq = seq
+        self.time_query = time_query
+        self.full_json = full_json
+        self.delta_json = delta_json
+        self.full_sse = _sse(full_json)
+        self.delta_sse = _sse(delta_json) if delta_json is not None else None
+
+
+def _sse(data: str) -> bytes:
+    return f"event: traffic\ndata: {data}\n\n".encode("utf-8")
+
+
+def _encode(time_query: int, full: bool, status: dict) -> str:
+    return json.dumps(
+        {"time_query": time_query, "full": full, "status": status},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+class TrafficTicker:
+    """
+    `clock()` trả về số giây mô phỏng đã trôi qua.
+    `loader(time_query)` trả về dict {segment_id: màu} của mốc đó.
+    `rate` là tốc độ phát lại: số giây mô phỏng trên mỗi giây thực.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float],
+        loader: Callable[[int], Awaitable[dict[str, str]]],
+        interval: int = DATA_INTERVAL,
+        loop_duration: int = LOOP_DURATION,
+        rate: float = 1.0,
+    ):
+        self._clock = clock
+        self._loader = loader
+        self._interval = interval
+        self._loop_duration = loop_duration
+        self._rate = rate
+        self._latest: Frame | None = None
+        self._status: dict[str, str] | None = None
+        self._event = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.subscribers = 0
+
+    def _time_query(self) -> int:
+        raw_second = int(self._clock()) % self._loop_duration
+        return (raw_second // self._interval) * self._interval
+
+    def _seconds_to_next_tick(self) -> float:
+        """Thời gian thực (giây) cần chờ tới mốc mô phỏng kế tiếp."""
+        return (self._interval - (self._clock() % self._interval)) / self._rate + _TICK_GRACE
+
+    async def _publish(self, time_query: int) -> None:
+        status = await self._loader(time_query)
+        previous = self._status
+        delta_json = None
+        if previous is not None:
+            delta = {sid: color for sid, color in status.items() if previous.get(sid) != color}
+            delta.update({sid: None for sid in previous.keys() - status.keys()})
+            delta_json = _encode(time_query, False, delta)
+
+        seq = self._latest.seq + 1 if self._latest else 0
+        self._latest = Frame(seq, time_query, _encode(time_query, True, status), delta_json)
+        self._status = status
+
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def _run(self) -> None:
+        while True:
+            time_query = self._time_query()
+            if self._latest is None or self._latest.time_query != time_query:
+                try:
+                    await self._publish(time_query)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("Không nạp được frame giao thông %s: %s", time_query, exc)
+                    await asyncio.sleep(_RETRY_DELAY)
+                    continue
+            await asyncio.sleep(self._seconds_to_next_tick())
+
+    def _acquire(self) -> None:
+        self.subscribers += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _release(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers == 0 and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._latest = None
+            self._status = None
+
+    async def frames(self, sse: bool = False) -> AsyncIterator[str | bytes]:
+        """
+        Sinh payload cho một subscriber. Frame đầu tiên (và mọi lần bị lỡ
+        frame) là snapshot đầy đủ, các frame liền kề sau đó chỉ là phần thay đổi.
+        """
+        self._acquire()
+        try:
+            last_seq: int | None = None
+            while True:
+                frame = self._latest
+                if frame is None or frame.seq == last_seq:
+                    await self._event.wait()
+                    continue
+
+                if last_seq is not None and frame.seq == last_seq + 1 and frame.delta_json is not None:
+                    payload = frame.delta_sse if sse else frame.delta_json
+                else:
+                    payload = frame.full_sse if sse else frame.full_json
+                last_seq = frame.seq
+                yield payload
+        finally:
+            self._release()
@@ -0,0 +1,104 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Mapbox Vector Tile cho các đoạn đường giao thông (ST_AsMVT).
+
+Độ đơn giản hóa tỉ lệ theo zoom: khoảng 1 pixel màn hình của tile 256px
+(tính bằng mét EPSG:3857). Ở zoom thấp, đoạn đường ngắn hơn vài pixel bị bỏ
+vì không nhìn thấy được.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUCache
+from app.services import traffic_store
+
+MAX_ZOOM = 22
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+LAYER_NAME = "traffic"
+
+# Chu vi trái đất theo EPSG:3857 (mét)
+_WORLD_SIZE = 40075016.68557849
+_SCREEN_TILE_SIZE = 256
+# Từ zoom này trở lên giữ mọi đoạn đường
+_FULL_DETAIL_ZOOM = 15
+# Ở zoom thấp bỏ đoạn ngắn hơn số pixel này
+_MIN_LENGTH_PIXELS = 2
+
+_cache = LRUCache(maxsize=4096)
+
+_TILE_QUERY = text(
+    """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS geom
+    ),
+    mvtgeom AS (
+        SELECT
+            s.id,
+            ST_AsMVTGeom(
+                ST_Simplify(ST_Transform(s.geom, 3857), :tolerance),
+                bounds.geom,
+                :extent,
+                :buffer,
+                true
+            ) AS geom
+        FROM traffic_segments s, bounds
+        WHERE s.geom && ST_Transform(bounds.geom, 4326)
+          AND (
+              CAST(:min_length AS float8) = 0
+              OR ST_Length(ST_Transform(s.geom, 3857)) >= CAST(:min_length AS float8)
+          )
+    )
+    SELECT ST_AsMVT(mvtgeom.*, :layer, :extent, 'geom')
+    FROM mvtgeom
+    WHERE geom IS NOT NULL
+    """
+)
+
+
+def pixel_size(z: int) -> float:
+    """Kích thước 1 pixel màn hình (mét EPSG:3857) tại zoom z."""
+    return _WORLD_SIZE / (_SCREEN_TILE_SIZE * (1 << z))
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+async def get_tile(db: AsyncSession, z: int, x: int, y: int) -> bytes:
+    key = (traffic_store.cache_version(), z, x, y)
+    tile = _cache.get(key)
+    if tile is not None:
+        return tile
+
+    pixel = pixel_size(z)
+    result = await db.execute(
+        _TILE_QUERY,
+        {
+            "z": z,
+            "x": x,
+            "y": y,
+            "tolerance": pixel,
+            "min_length": 0 if z >= _FULL_DETAIL_ZOOM else pixel * _MIN_LENGTH_PIXELS,
+            "extent": TILE_EXTENT,
+            "buffer": TILE_BUFFER,
+            "layer": LAYER_NAME,
+        },
+    )
+    tile = bytes(result.scalar() or b"")
+    _cache.set(key, tile)
+    return tile
@@ -14,19 +14,12 @@
 
 import asyncio
 from datetime import datetime
-import httpx
 import traceback
 
 from app.core.config import settings
 from app.services import weather as weather_service
+from app.services.orion import OrionClient
 
-print("--- [DEBUG] Đang cấu hình URLs... ---")
-ORION_UPSERT_URL = f"{settings.orion_broker_url}/ngsi-ld/v1/entityOperations/upsert?options=update"
-
-HEADERS = {
-    "Content-Type": "application/ld+json",
-    "Accept": "application/json"
-}
 CONTEXT = settings.ngsi_context_url
 HANOI_DISTRICTS = [
     {"id": "HoanKiem", "name": "Hoàn Kiếm", "lat": 21.0285, "lon": 105.8542},
@@ -96,39 +89,34 @@ def translate_to_ngsi_weather(data: dict, district_info: dict) -> dict:
 
 async def run_weather_agent():
     print("--- [Đặc Vụ Thời Tiết] Khởi động ---")
-    
-    while True:
-        print(f"\n[{datetime.now()}] Đang cập nhật thời tiết cho {len(HANOI_DISTRICTS)} quận...")
-        entities_to_upsert = []
-        
-        try:
-            for district in HANOI_DISTRICTS:
-                weather_data = await weather_service.get_weather_forecast(district["lat"], district["lon"])
-                
-                if weather_data:
-                    ngsi_entity = translate_to_ngsi_weather(weather_data, district)
-                    entities_to_upsert.append(ngsi_entity)
-            
-            if entities_to_upsert:
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        ORION_UPSERT_URL,
-                        headers=HEADERS,
-                        json=entities_to_upsert,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code in [201, 204]:
-                        print(f"✅ Đã cập nhật thành công {len(entities_to_upsert)} trạm thời tiết.")
+
+    async with OrionClient() as orion:
+        while True:
+            print(f"\n[{datetime.now()}] Đang cập nhật thời tiết cho {len(HANOI_DISTRICTS)} quận...")
+            entities_to_upsert = []
+
+            try:
+                for district in HANOI_DISTRICTS:
+                    weather_data = await weather_service.get_weather_forecast(district["lat"], district["lon"])
+
+                    if weather_data:
+                        ngsi_entity = translate_to_ngsi_weather(weather_data, district)
+                        entities_to_upsert.append(ngsi_entity)
+
+                if entities_to_upsert:
+                    response = await orion.upsert_entities(entities_to_upsert, timeout=30.0)
+
+                    if response.status_code == 207:
+                        print(f"⚠️ Cập nhật 1 phần (Multi-Status): {response.text}")
                     else:
-                        print(f"❌ Lỗi Orion: {response.status_code} - {response.text}")
-                        
-        except Exception as e:
-            print(f"Lỗi Vòng lặp: {e}")
-            traceback.print_exc()
-        
-        print("--- Nghỉ 15 phút... ---")
-        await asyncio.sleep(900) 
+                        print(f"✅ Đã cập nhật thành công {len(entities_to_upsert)} trạm thời tiết.")
+
+            except Exception as e:
+                print(f"Lỗi Vòng lặp: {e}")
+                traceback.print_exc()
+
+            print("--- Nghỉ 15 phút... ---")
+            await asyncio.sleep(900)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,87 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+So sánh hai bố cục bảng frame giao thông: dung lượng (bảng + chỉ mục + TOAST)
+và thời gian truy vấn trạng thái một mốc giây.
+
+Chạy sau khi nạp cả hai bố cục:
+    TRAFFIC_FRAME_LAYOUT=both python process_simulation.py
+    python -m benchmarks.bench_frame_layout --queries 200
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.db.session import AsyncSessionLocal
+from app.services import traffic_db
+from app.services.traffic_store import DATA_INTERVAL, LOOP_DURATION
+
+TABLES = {"rows": "simulation_frames", "packed": "simulation_slots"}
+QUERIES = {"rows": traffic_db._query_rows, "packed": traffic_db._query_packed}
+
+
+async def _table_size(db, table: str) -> tuple[int, int]:
+    result = await db.execute(text(
+        f"SELECT pg_total_relation_size('{table}'), (SELECT count(*) FROM {table})"
+    ))
+    size, count = result.one()
+    return size, count
+
+
+async def _time_queries(db, layout: str, seconds: list[int]) -> tuple[float, int]:
+    query = QUERIES[layout]
+    # Làm nóng (nạp danh sách seq, cache trang)
+    await query(db, seconds[0], None)
+    started = time.perf_counter()
+    segments = 0
+    for second in seconds:
+        segments += len(await query(db, second, None))
+    return time.perf_counter() - started, segments
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    seconds = [random.randrange(0, LOOP_DURATION, DATA_INTERVAL) for _ in range(args.queries)]
+    async with AsyncSessionLocal() as db:
+        results = {}
+        for layout, table in TABLES.items():
+            size, count = await _table_size(db, table)
+            if not count:
+                print(f"⚠️  Bảng {table} trống, bỏ qua (nạp với TRAFFIC_FRAME_LAYOUT=both).")
+                continue
+            elapsed, segments = await _time_queries(db, layout, seconds)
+            results[layout] = (size, elapsed)
+            print(
+                f"{layout:<7} {table:<18} {count:>12,} dòng  {size / 1024 / 1024:10.1f} MB  "
+                f"{elapsed / len(seconds) * 1000:8.2f} ms/truy vấn  ({segments / len(seconds):,.0f} đoạn/mốc)"
+            )
+
+    if len(results) == 2:
+        (rows_size, rows_time), (packed_size, packed_time) = results["rows"], results["packed"]
+        print(f"packed nhỏ hơn {rows_size / packed_size:.1f}x, truy vấn nhanh hơn {rows_time / packed_time:.1f}x")
+
+
+if __name__ == "__main__":
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đo tìm địa điểm theo tên: `ILIKE '%kw%'` (cách cũ của _find_location_by_name)
+vs truy vấn trigram trên name_norm (crud.search_locations) với N dòng giả lập.
+
+Dữ liệu nằm trong bảng tạm (TEMP) cùng cấu trúc/chỉ mục với green_locations,
+không đụng tới dữ liệu thật. Cần Postgres đã chạy init_db (unaccent, pg_trgm,
+f_unaccent):
+    python -m benchmarks.bench_location_search --rows 100000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import text
+
+from app.db.session import engine
+
+PREFIXES = ["Công viên", "Trạm sạc", "Vườn hoa", "Hồ", "Bảo tàng", "Điểm thuê xe đạp", "Quảng trường"]
+WORDS = [
+    "Thống Nhất", "Hoàn Kiếm", "Tây Hồ", "Cầu Giấy", "Đống Đa", "Hai Bà Trưng", "Long Biên",
+    "Thanh Xuân", "Hoàng Mai", "Hà Đông", "Nghĩa Đô", "Yên Sở", "Lê Nin", "Bách Thảo", "Văn Miếu",
+]
+# (từ khóa, mô tả): có dấu, không dấu, sai chính tả nhẹ
+QUERIES = [
+    ("Công viên Thống Nhất", "có dấu"),
+    ("cong vien thong nhat", "không dấu"),
+    ("cong vien thong nhatt", "gõ sai"),
+    ("bach thao", "không dấu, một phần tên"),
+]
+
+OLD_SQL = """
+    SELECT id FROM bench_locations WHERE name ILIKE :pattern ORDER BY id DESC LIMIT 1
+"""
+NEW_SQL = """
+    SELECT id, word_similarity(lower(f_unaccent(:q)), name_norm) AS score
+    FROM bench_locations
+    WHERE name_norm LIKE '%' || lower(f_unaccent(:q)) || '%'
+       OR lower(f_unaccent(:q)) <% name_norm
+    ORDER BY score DESC, similarity(lower(f_unaccent(:q)), name_norm) DESC, id DESC
+    LIMIT 20
+"""
+
+
+def make_names(count: int) -> list[str]:
+    rng = random.Random(42)
+    return [f"{rng.choice(PREFIXES)} {rng.choice(WORDS)} {i}" for i in range(count)]
+
+
+async def timed(conn, sql: str, params: dict, rounds: int) -> tuple[float, int]:
+    await conn.execute(text(sql), params)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = await conn.execute(text(sql), params)
+        rows = result.all()
+    return (time.perf_counter() - started) / rounds * 1000, len(rows)
+
+
+async def run(row_count: int, rounds: int) -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("""
+            CREATE TEMP TABLE bench_locations (
+                id serial PRIMARY KEY,
+                name varchar(255) NOT NULL,
+                name_norm text GENERATED ALWAYS AS (lower(f_unaccent(name))) STORED
+            )
+        """))
+        started = time.perf_counter()
+        await conn.execute(
+            text("INSERT INTO bench_locations (name) SELECT unnest(CAST(:names AS text[]))"),
+            {"names": make_names(row_count)},
+        )
+        await conn.execute(text("CREATE INDEX ON bench_locations USING gin (name_norm gin_trgm_ops)"))
+        await conn.execute(text("ANALYZE bench_locations"))
+        print(f"{row_count} dòng, nạp + tạo chỉ mục: {time.perf_counter() - started:.1f}s")
+
+        for query, label in QUERIES:
+            old_ms, old_hits = await timed(conn, OLD_SQL, {"pattern": f"%{query}%"}, rounds)
+            new_ms, new_hits = await timed(conn, NEW_SQL, {"q": query}, rounds)
+            print(
+                f"  {query!r:26} ({label}): ILIKE {old_ms:7.2f} ms ({old_hits} kết quả)"
+                f" | trigram {new_ms:7.2f} ms ({new_hits} kết quả)"
+            )
+        await conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
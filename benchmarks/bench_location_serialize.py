@@ -0,0 +1,99 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đo serialize LocationRead: cách cũ (to_shape hai lần mỗi địa điểm) vs đọc
+POINT WKB bằng struct, giải mã một lần. Không cần DB: dùng GreenLocation
+giả lập với EWKB giống dữ liệu PostGIS trả về.
+
+    python -m benchmarks.bench_location_serialize --locations 10000
+"""
+
+import argparse
+import random
+import time
+
+import shapely.wkb
+from geoalchemy2.elements import WKBElement
+from geoalchemy2.shape import to_shape
+from pydantic import computed_field
+from shapely.geometry import Point
+
+from app.models import GreenLocation, LocationType
+from app.schemas import LocationRead
+
+
+class LegacyLocationRead(LocationRead):
+    """LocationRead trước khi có đường nhanh: mỗi trường tọa độ tự gọi to_shape."""
+
+    @computed_field
+    @property
+    def latitude(self) -> float:
+        if self.location:
+            return to_shape(self.location).y
+        return 0.0
+
+    @computed_field
+    @property
+    def longitude(self) -> float:
+        if self.location:
+            return to_shape(self.location).x
+        return 0.0
+
+
+def make_locations(count: int) -> list[GreenLocation]:
+    rng = random.Random(42)
+    types = list(LocationType)
+    locations = []
+    for i in range(count):
+        point = Point(105.7 + rng.random() * 0.3, 20.9 + rng.random() * 0.2)
+        locations.append(
+            GreenLocation(
+                id=i,
+                name=f"Địa điểm {i}",
+                location_type=rng.choice(types),
+                description=None,
+                is_active=True,
+                # PostGIS trả về EWKB (có SRID) dạng hex
+                location=WKBElement(shapely.wkb.dumps(point, srid=4326, hex=True), extended=True),
+            )
+        )
+    return locations
+
+
+def bench(schema: type[LocationRead], locations: list[GreenLocation], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        [schema.model_validate(location).model_dump(mode="json") for location in locations]
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--locations", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    locations = make_locations(args.locations)
+    legacy = bench(LegacyLocationRead, locations, args.rounds)
+    fast = bench(LocationRead, locations, args.rounds)
+    print(f"{args.locations} địa điểm (tốt nhất sau {args.rounds} lần)")
+    print(f"  to_shape x2 : {legacy * 1000:8.1f} ms")
+    print(f"  struct WKB  : {fast * 1000:8.1f} ms  ({legacy / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
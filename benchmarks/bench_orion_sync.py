@@ -0,0 +1,83 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đo phần gửi của sync_to_orion.py: các lô gửi lần lượt vs song song có giới
+hạn trên một client. Orion được giả lập (không cần broker) với độ trễ cố
+định mỗi lời gọi upsert.
+
+    python -m benchmarks.bench_orion_sync --locations 50000 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+
+import sync_to_orion
+from app.services.orion import OrionClient
+
+
+def make_rows(count: int) -> list:
+    return [
+        SimpleNamespace(
+            id=i, name=f"POI {i}", location_type="PUBLIC_PARK", description=None,
+            lon=105.8 + i * 1e-6, lat=21.0 + i * 1e-6,
+        )
+        for i in range(count)
+    ]
+
+
+def mock_transport(latency: float) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(204)
+    return httpx.MockTransport(handler)
+
+
+async def run(rows: list, latency: float, batch_size: int, concurrency: int) -> float:
+    batches = [
+        [sync_to_orion.build_entity(row) for row in rows[i:i + batch_size]]
+        for i in range(0, len(rows), batch_size)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    async with OrionClient("http://orion.bench", transport=mock_transport(latency)) as orion:
+        async def send(batch):
+            async with semaphore:
+                await orion.upsert_entities(batch)
+        await asyncio.gather(*(send(batch) for batch in batches))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--locations", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Độ trễ giả lập mỗi lời gọi (giây)")
+    parser.add_argument("--batch-size", type=int, default=sync_to_orion.BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=sync_to_orion.CONCURRENCY)
+    args = parser.parse_args()
+
+    rows = make_rows(args.locations)
+    batches = -(-args.locations // args.batch_size)
+    print(f"{args.locations} địa điểm, {batches} lô x {args.batch_size}, trễ {args.latency * 1000:.0f} ms/lô")
+    for concurrency in sorted({1, args.concurrency}):
+        elapsed = asyncio.run(run(rows, args.latency, args.batch_size, concurrency))
+        print(f"  song song {concurrency:>2}: {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
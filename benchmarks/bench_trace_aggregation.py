@@ -0,0 +1,107 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+So sánh bước gom tốc độ theo (giây, làn) trên dữ liệu vết xe tổng hợp:
+dict-of-lists + statistics.mean (cách cũ) vs SpeedAggregator (NumPy).
+
+    python -m benchmarks.bench_trace_aggregation --rows 50000000
+    python -m benchmarks.bench_trace_aggregation --rows 50000000 --skip-baseline
+
+Cách cũ cần vài chục GB RAM ở 50 triệu dòng; dùng --baseline-rows để chạy
+nó trên một phần dữ liệu và ngoại suy.
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.services.simulation_trace import SpeedAggregator
+
+CHUNK_ROWS = 1_000_000
+
+
+def make_trace(rows: int, lanes: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    times = (rng.integers(0, 360, rows, dtype=np.int64) * 10)
+    lane_idx = rng.integers(0, lanes, rows, dtype=np.int64)
+    speeds = rng.gamma(2.0, 8.0, rows)
+    return times, lane_idx, speeds
+
+
+def aggregate_dict_of_lists(times, lanes, speeds):
+    """Bản sao logic cũ của process_simulation.py (bước 2 + tô màu)."""
+    frames_data = {}
+    for t, lane, speed in zip(times, lanes, speeds):
+        if t not in frames_data: frames_data[t] = {}
+        if lane not in frames_data[t]: frames_data[t][lane] = []
+        frames_data[t][lane].append(speed)
+
+    result = []
+    for t, lane_speeds in frames_data.items():
+        for lane, values in lane_speeds.items():
+            avg_spd = statistics.mean(values)
+            if avg_spd < 5: color = "red"
+            elif avg_spd < 20: color = "orange"
+            else: color = "green"
+            result.append((t, lane, avg_spd, color))
+    return result
+
+
+def aggregate_numpy(times, lanes, speeds):
+    aggregator = SpeedAggregator()
+    for start in range(0, len(times), CHUNK_ROWS):
+        end = start + CHUNK_ROWS
+        aggregator.add(times[start:end], lanes[start:end], speeds[start:end])
+    return aggregator.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--lanes", type=int, default=5_000)
+    parser.add_argument("--baseline-rows", type=int, default=None,
+                        help="Số dòng cho cách cũ (mặc định bằng --rows)")
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    print(f"Sinh {args.rows:,} dòng vết xe tổng hợp ({args.lanes:,} làn)...")
+    times, lanes, speeds = make_trace(args.rows, args.lanes)
+
+    started = time.perf_counter()
+    out_times, _, _, _ = aggregate_numpy(times, lanes, speeds)
+    numpy_elapsed = time.perf_counter() - started
+    print(f"NumPy        : {numpy_elapsed:8.2f}s  ({args.rows / numpy_elapsed:,.0f} dòng/s, {len(out_times):,} nhóm)")
+
+    if args.skip_baseline:
+        return
+
+    baseline_rows = min(args.baseline_rows or args.rows, args.rows)
+    # Cách cũ làm việc trên list Python, chuyển đổi trước để không tính vào thời gian
+    py_times = times[:baseline_rows].tolist()
+    py_lanes = lanes[:baseline_rows].tolist()
+    py_speeds = speeds[:baseline_rows].tolist()
+
+    started = time.perf_counter()
+    aggregate_dict_of_lists(py_times, py_lanes, py_speeds)
+    baseline_elapsed = time.perf_counter() - started
+    baseline_rate = baseline_rows / baseline_elapsed
+    print(f"dict-of-lists: {baseline_elapsed:8.2f}s  ({baseline_rate:,.0f} dòng/s trên {baseline_rows:,} dòng)")
+    print(f"NumPy nhanh hơn {args.rows / numpy_elapsed / baseline_rate:.1f}x (theo dòng/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+So sánh requests/sec của /traffic/live: kho frame mmap vs truy vấn Postgres.
+
+Chạy sau `process_simulation.py` (cần cả DB lẫn file kho frame):
+    python -m benchmarks.bench_traffic_live --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from app.main import app
+from app.services import traffic_store
+
+
+async def _run(label: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Làm nóng (nạp mmap, mở pool kết nối DB)
+        await client.get("/traffic/live")
+
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(i)
+
+        async def worker():
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                response = await client.get("/traffic/live")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    rps = total / elapsed
+    print(f"{label:<12} {total} requests trong {elapsed:.2f}s -> {rps:,.0f} req/s")
+    return rps
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    store = traffic_store.get_frame_store()
+    if store is None:
+        print("❌ Chưa có kho frame. Hãy chạy process_simulation.py trước.")
+        sys.exit(1)
+    print(f"Kho frame: {store.slot_count} slot x {store.segment_count} đoạn đường")
+
+    mmap_rps = await _run("mmap", args.requests, args.concurrency)
+
+    # Ép route đi đường SQL
+    original = traffic_store.get_frame_store
+    traffic_store.get_frame_store = lambda: None
+    try:
+        sql_rps = await _run("postgres", args.requests, args.concurrency)
+    finally:
+        traffic_store.get_frame_store = original
+
+    print(f"mmap nhanh hơn {mmap_rps / sql_rps:.1f}x")
+
+
+if __name__ == "__main__":
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Đo /traffic/summary: tổng hợp dựng sẵn trong kho frame vs gom trực tiếp
+trong Postgres.
+
+Kho frame tổng hợp (không cần DB):
+    python -m benchmarks.bench_traffic_summary --segments 5000
+
+Thêm so sánh với truy vấn SQL (cần dữ liệu đã nạp bằng process_simulation.py):
+    python -m benchmarks.bench_traffic_summary --sql
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app.db.session import AsyncSessionLocal
+from app.services import traffic_db, traffic_store
+from app.services.traffic_store import DATA_INTERVAL, LOOP_DURATION
+
+
+def make_store(path: str, segment_count: int) -> float:
+    rng = random.Random(42)
+    segment_ids = [f"lane_{i}" for i in range(segment_count)]
+    frames, speeds = {}, {}
+    for second in range(0, LOOP_DURATION, DATA_INTERVAL):
+        slot_speeds = {sid: rng.gammavariate(2.0, 8.0) for sid in segment_ids if rng.random() < 0.8}
+        speeds[second] = slot_speeds
+        frames[second] = {
+            sid: "red" if v < 5 else "orange" if v < 20 else "green" for sid, v in slot_speeds.items()
+        }
+    bounds = {sid: (105.8, 21.0, 105.81, 21.01) for sid in segment_ids}
+
+    started = time.perf_counter()
+    traffic_store.write_frame_store(path, segment_ids, frames, bounds, speeds=speeds)
+    return time.perf_counter() - started
+
+
+def bench_store(store: traffic_store.FrameStore, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for slot in range(store.slot_count):
+            store.summary(slot)
+    return (time.perf_counter() - started) / (rounds * store.slot_count)
+
+
+async def bench_sql(rounds: int) -> float:
+    seconds = list(range(0, LOOP_DURATION, DATA_INTERVAL))
+    async with AsyncSessionLocal() as db:
+        await traffic_db.query_summaries(db, seconds[:1])
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await traffic_db.query_summaries(db, [random.choice(seconds)])
+        return (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=5_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--sql", action="store_true", help="So sánh với truy vấn Postgres")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "frames.bin")
+        build = make_store(path, args.segments)
+        store = traffic_store.FrameStore(path)
+        print(f"Ghi kho frame ({store.slot_count} slot x {store.segment_count:,} đoạn, kèm summary): {build:.2f}s")
+        per_slot = bench_store(store, args.rounds)
+        print(f"kho frame : {per_slot * 1e6:10.2f} µs/mốc")
+
+    if args.sql:
+        sql_per_slot = asyncio.run(bench_sql(args.rounds))
+        print(f"postgres  : {sql_per_slot * 1e6:10.2f} µs/mốc  (chậm hơn {sql_per_slot / per_slot:,.0f}x)")
+
+
+if __name__ == "__main__":
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    main()
@@ -12,135 +12,294 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
+import os
+import sys
+import time
 import asyncio
-import statistics
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from sqlalchemy import text
 from app.db.session import engine
+from app.core.config import settings
+from app.services import traffic_db, traffic_store
+from app.services.lane_geometry import LanePoints, build_lane_line
+from app.services.simulation_trace import (
+    SpeedAggregator,
+    chunk_paths,
+    is_chunked_trace,
+    iter_chunk_records,
+    iter_trace_records,
+)
+
+try:
+    import resource
+except ImportError:  # Windows không có module resource
+    resource = None
+
+TRACE_DIR = os.path.join("Data", "simulation_trace") # Định dạng chunk (Data/convert_trace.py)
+INPUT_FILE = os.path.join("Data", "simulation_data.json")
+PROGRESS_EVERY = 1_000_000 # In tiến độ sau mỗi 1 triệu dòng vết xe
+CHUNK_ROWS = 1_000_000 # Số dòng mỗi khối cột đưa vào NumPy
 
-INPUT_FILE = 'Data\simulation_data.json'
-BATCH_SIZE = 2000 # Kích thước lô: 2000 dòng chèn 1 lần
-
-async def process_data():
-    print("--- 🚀 BẮT ĐẦU XỬ LÝ DỮ LIỆU MÔ PHỎNG (CHẾ ĐỘ BATCH) ---")
-    
-    try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-    except FileNotFoundError:
-        print(f"❌ Lỗi: Không tìm thấy file {INPUT_FILE}")
-        return
 
-    print(f"📂 Đã đọc {len(raw_data)} dòng dữ liệu.")
+def peak_rss_mb() -> float | None:
+    """Bộ nhớ đỉnh (RSS) của tiến trình, tính bằng MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
 
-    # 1. Tái tạo hình học
-    print("1️⃣ Đang tái tạo hình học đường đi từ vết xe...")
+
+def scan_records(records, progress: bool = True):
+    """
+    Đọc bản ghi vết xe một lượt duy nhất (streaming).
+    Cột (giây, chỉ số làn, tốc độ) được gom theo khối CHUNK_ROWS dòng rồi
+    đưa cho SpeedAggregator (NumPy); điểm (lon, lat) của từng làn giữ trong
+    LanePoints (tối đa MAX_LANE_POINTS điểm mỗi làn).
+    """
     segments_points = {}
-    for item in raw_data:
-        lane = item['lane_id']
-        if lane.startswith(":"): continue 
-        if lane not in segments_points:
-            segments_points[lane] = []
-        segments_points[lane].append((item['lon'], item['lat']))
+    lane_index = {}
+    aggregator = SpeedAggregator()
+    times, lanes, speeds = array("q"), array("q"), array("d")
+    row_count = 0
+    started = time.perf_counter()
+
+    for item in records:
+        row_count += 1
+        if progress and row_count % PROGRESS_EVERY == 0:
+            rate = row_count / (time.perf_counter() - started)
+            print(f"      ... Đã đọc {row_count:,} dòng ({rate:,.0f} dòng/s)")
 
-    # 2. Tính toán frames
-    print("2️⃣ Đang tính toán trạng thái giao thông từng giây...")
-    frames_data = {} 
-    for item in raw_data:
-        t = item['time_sec']
         lane = item['lane_id']
         if lane.startswith(":"): continue
-        
-        if t not in frames_data: frames_data[t] = {}
-        if lane not in frames_data[t]: frames_data[t][lane] = []
-        frames_data[t][lane].append(item['speed'])
-
-    # 3. Lưu vào Database
-    print("3️⃣ Bắt đầu ghi vào PostgreSQL (Batch Insert)...")
-    
+
+        idx = lane_index.get(lane)
+        if idx is None:
+            idx = lane_index[lane] = len(lane_index)
+            segments_points[lane] = LanePoints()
+        segments_points[lane].add((item['lon'], item['lat']))
+
+        times.append(int(item['time_sec']))
+        lanes.append(idx)
+        speeds.append(item['speed'])
+        if len(times) >= CHUNK_ROWS:
+            aggregator.add(times, lanes, speeds)
+            times, lanes, speeds = array("q"), array("q"), array("d")
+
+    aggregator.add(times, lanes, speeds)
+    return segments_points, list(lane_index), aggregator, row_count
+
+
+def aggregate_chunk(path: str):
+    """Chạy trong tiến trình con: gom một chunk, trả về kết quả từng phần (picklable)."""
+    segments_points, lane_ids, aggregator, row_count = scan_records(
+        iter_chunk_records(path), progress=False
+    )
+    return segments_points, lane_ids, aggregator.partial(), row_count
+
+
+def aggregate_chunked_traces(path: str):
+    """
+    Mỗi chunk được đọc bởi một tiến trình trong ProcessPool, sau đó gộp:
+    đánh lại chỉ số làn theo danh sách chung, gộp mẫu điểm hình học và cộng
+    dồn tổng/số mẫu tốc độ.
+    """
+    chunks = chunk_paths(path)
+    workers = max(1, min(len(chunks), os.cpu_count() or 1))
+    print(f"   -> {len(chunks)} chunk, {workers} tiến trình")
+
+    segments_points = {}
+    lane_index = {}
+    aggregator = SpeedAggregator()
+    row_count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, (chunk_points, chunk_lanes, partial, chunk_rows) in enumerate(
+            pool.map(aggregate_chunk, chunks), start=1
+        ):
+            mapping = np.empty(len(chunk_lanes), dtype=np.int64)
+            for local_idx, lane in enumerate(chunk_lanes):
+                idx = lane_index.get(lane)
+                if idx is None:
+                    idx = lane_index[lane] = len(lane_index)
+                    segments_points[lane] = LanePoints()
+                segments_points[lane].merge(chunk_points[lane])
+                mapping[local_idx] = idx
+
+            times, lanes, sums, counts = partial
+            aggregator.add_partial(times, mapping[lanes], sums, counts)
+            row_count += chunk_rows
+            print(f"      ... {done}/{len(chunks)} chunk, {row_count:,} dòng")
+
+    return segments_points, list(lane_index), aggregator, row_count
+
+
+def aggregate_traces(path: str):
+    """Gom vết xe từ file (đọc tuần tự) hoặc thư mục chunk (đọc song song)."""
+    started = time.perf_counter()
+    if is_chunked_trace(path):
+        segments_points, lane_ids, aggregator, row_count = aggregate_chunked_traces(path)
+    else:
+        segments_points, lane_ids, aggregator, row_count = scan_records(iter_trace_records(path))
+
+    elapsed = time.perf_counter() - started
+    print(f"📂 Đã đọc {row_count:,} dòng trong {elapsed:.1f}s ({row_count / max(elapsed, 1e-9):,.0f} dòng/s).")
+    return segments_points, lane_ids, aggregator.result()
+
+
+def default_input() -> str:
+    """Ưu tiên thư mục chunk (đọc song song), không có thì dùng file JSON gốc."""
+    return TRACE_DIR if is_chunked_trace(TRACE_DIR) else INPUT_FILE
+
+
+async def process_data(input_file: str | None = None):
+    input_file = input_file or default_input()
+    print("--- 🚀 BẮT ĐẦU XỬ LÝ DỮ LIỆU MÔ PHỎNG (CHẾ ĐỘ STREAMING + COPY) ---")
+
+    if not os.path.exists(input_file):
+        print(f"❌ Lỗi: Không tìm thấy file {input_file}")
+        return
+
+    # 1 + 2. Một lượt đọc: gom điểm hình học và tốc độ trung bình theo (giây, làn)
+    print("1️⃣ Đang đọc vết xe, tái tạo hình học và gom tốc độ theo từng giây...")
+    segments_points, lane_ids, (frame_times, frame_lanes, frame_speeds, frame_colors) = aggregate_traces(input_file)
+
+    # Hình học từng làn: sắp điểm theo trục chính rồi đơn giản hóa (Douglas–Peucker)
+    tolerance = settings.traffic_simplify_tolerance
+    segment_records = []
+    segment_bounds = {}
+    raw_vertices = kept_vertices = 0
+    for lane_id, points in segments_points.items():
+        line = build_lane_line(points, tolerance)
+        if line is None: continue
+
+        vertex_count = len(line.coords)
+        raw_vertices += len(points)
+        kept_vertices += vertex_count
+        segment_records.append((lane_id, line.wkt, vertex_count))
+        segment_bounds[lane_id] = line.bounds
+    print(f"   -> Hình học: {raw_vertices:,} điểm -> {kept_vertices:,} đỉnh (sai số {tolerance} m)")
+    del segments_points
+
+    # Trạng thái từng frame: sinh dần cho COPY, không dựng list trung gian
+    print("2️⃣ Đang tính toán trạng thái giao thông từng giây...")
+    saved_lanes = np.array([lane_id in segment_bounds for lane_id in lane_ids], dtype=bool)
+    if len(frame_lanes):
+        mask = saved_lanes[frame_lanes]
+        frame_times, frame_lanes = frame_times[mask], frame_lanes[mask]
+        frame_speeds, frame_colors = frame_speeds[mask], frame_colors[mask]
+    frame_count = len(frame_times)
+
+    # seq của đoạn đường = vị trí trong danh sách ID đã sắp xếp (giống kho frame)
+    segment_order = sorted(segment_bounds)
+    seq_of = {lane_id: seq for seq, lane_id in enumerate(segment_order)}
+    segment_records = [
+        (lane_id, seq_of[lane_id], wkt, vertex_count) for lane_id, wkt, vertex_count in segment_records
+    ]
+    lane_seq = np.array([seq_of.get(lane_id, -1) for lane_id in lane_ids], dtype=np.int64)
+    seqs = lane_seq[frame_lanes] # mọi làn còn lại sau mask đều có seq
+    layouts = traffic_db.frame_layouts()
+
+    def frame_rows():
+        for t, lane_idx, avg_spd, code in zip(
+            frame_times.tolist(), frame_lanes.tolist(), frame_speeds.tolist(), frame_colors.tolist()
+        ):
+            yield (t, lane_ids[lane_idx], avg_spd, traffic_store.COLOR_NAMES[code])
+
+    def slot_rows():
+        """Bố cục packed: mỗi giây một dòng (bytea màu, real[] tốc độ) theo seq."""
+        # frame_times đã sắp tăng dần: tách thành từng khối cùng giây
+        slot_times, starts = np.unique(frame_times, return_index=True)
+        ends = np.append(starts[1:], frame_count)
+        for t, start, end in zip(slot_times.tolist(), starts.tolist(), ends.tolist()):
+            colors = np.zeros(len(segment_order), dtype=np.uint8)
+            speeds = np.full(len(segment_order), np.nan, dtype=np.float32)
+            colors[seqs[start:end]] = frame_colors[start:end]
+            speeds[seqs[start:end]] = frame_speeds[start:end]
+            yield (t, colors.tobytes(), [None if v != v else v for v in speeds.tolist()])
+
+    # 3. Lưu vào Database bằng COPY (asyncpg)
+    print("3️⃣ Bắt đầu ghi vào PostgreSQL (COPY)...")
+
     async with engine.begin() as conn:
+        raw_conn = await conn.get_raw_connection()
+        pg = raw_conn.driver_connection
+
         # A. Xóa cũ
         print("   -> Làm sạch bảng cũ...")
-        await conn.execute(text("TRUNCATE TABLE simulation_frames, traffic_segments CASCADE"))
-        
-        # B. Lưu TrafficSegments
-        print(f"   -> Đang chuẩn bị {len(segments_points)} đoạn đường...")
-        saved_segment_ids = set()
-        segment_params = []
-        
-        for lane_id, points in segments_points.items():
-            unique_points = sorted(list(set(points)))
-            if len(unique_points) < 2: continue
-            
-            # Lấy mẫu để vẽ đường
-            path_points = unique_points
-            
-            # Tạo chuỗi WKT
-            wkt_coords = ", ".join([f"{p[0]} {p[1]}" for p in path_points])
-            wkt = f"LINESTRING({wkt_coords})"
-            
-            segment_params.append({"id": lane_id, "wkt": wkt})
-            saved_segment_ids.add(lane_id)
-            
-            # Thực thi Batch nếu đầy
-            if len(segment_params) >= BATCH_SIZE:
-                await conn.execute(text("""
-                    INSERT INTO traffic_segments (id, geom) 
-                    VALUES (:id, ST_GeomFromText(:wkt, 4326))
-                    ON CONFLICT (id) DO NOTHING
-                """), segment_params)
-                segment_params = [] # Reset lô
-        
-        # Nạp nốt lô cuối cùng
-        if segment_params:
-            await conn.execute(text("""
-                INSERT INTO traffic_segments (id, geom) 
-                VALUES (:id, ST_GeomFromText(:wkt, 4326))
-                ON CONFLICT (id) DO NOTHING
-            """), segment_params)
-
-        # C. Lưu SimulationFrames
-        print(f"   -> Đang chuẩn bị dữ liệu Frames...")
-        frame_params = []
-        total_frames_count = 0
-        
-        for t, lanes in frames_data.items():
-            for lane_id, speeds in lanes.items():
-                if lane_id not in saved_segment_ids: continue
-                if not speeds: continue
-                
-                avg_spd = statistics.mean(speeds)
-                
-                if avg_spd < 5: color = "red"
-                elif avg_spd < 20: color = "orange"
-                else: color = "green"
-                
-                frame_params.append({
-                    "t": t, 
-                    "sid": lane_id, 
-                    "spd": avg_spd, 
-                    "color": color
-                })
-                
-                # Thực thi Batch nếu đầy
-                if len(frame_params) >= BATCH_SIZE:
-                    await conn.execute(text("""
-                        INSERT INTO simulation_frames (time_second, segment_id, avg_speed, status_color)
-                        VALUES (:t, :sid, :spd, :color)
-                    """), frame_params)
-                    total_frames_count += len(frame_params)
-                    print(f"      ... Đã nạp {total_frames_count} bản ghi frame")
-                    frame_params = [] # Reset lô
-
-        # Nạp nốt lô cuối cùng
-        if frame_params:
-            await conn.execute(text("""
-                INSERT INTO simulation_frames (time_second, segment_id, avg_speed, status_color)
-                VALUES (:t, :sid, :spd, :color)
-            """), frame_params)
-            print(f"      ... Đã nạp {total_frames_count + len(frame_params)} bản ghi frame")
+        await conn.execute(text(
+            "TRUNCATE TABLE simulation_frames, simulation_slots, traffic_segments CASCADE"
+        ))
+
+        # B. Lưu TrafficSegments: COPY vào bảng tạm dạng WKT rồi chuyển sang geometry
+        print(f"   -> Đang nạp {len(segment_records)} đoạn đường...")
+        started = time.perf_counter()
+        await conn.execute(text("""
+            CREATE TEMP TABLE traffic_segments_stage (
+                id text, seq integer, wkt text, vertex_count integer
+            ) ON COMMIT DROP
+        """))
+        await pg.copy_records_to_table(
+            "traffic_segments_stage", records=segment_records, columns=["id", "seq", "wkt", "vertex_count"]
+        )
+        await conn.execute(text("""
+            INSERT INTO traffic_segments (id, seq, geom, vertex_count)
+            SELECT id, seq, ST_GeomFromText(wkt, 4326), vertex_count FROM traffic_segments_stage
+            ON CONFLICT (id) DO NOTHING
+        """))
+        elapsed = time.perf_counter() - started
+        print(f"      ... {len(segment_records) / max(elapsed, 1e-9):,.0f} dòng/s")
+
+        # C. Lưu SimulationFrames (bố cục rows)
+        if "rows" in layouts:
+            print(f"   -> Đang nạp {frame_count:,} bản ghi frame...")
+            started = time.perf_counter()
+            await pg.copy_records_to_table(
+                "simulation_frames",
+                records=frame_rows(),
+                columns=["time_second", "segment_id", "avg_speed", "status_color"],
+            )
+            elapsed = time.perf_counter() - started
+            print(f"      ... Đã nạp {frame_count:,} bản ghi frame ({frame_count / max(elapsed, 1e-9):,.0f} dòng/s)")
+
+        # D. Lưu SimulationSlots (bố cục packed)
+        if "packed" in layouts:
+            print(f"   -> Đang nạp frame dạng packed ({len(segment_order)} đoạn/dòng)...")
+            started = time.perf_counter()
+            await pg.copy_records_to_table(
+                "simulation_slots",
+                records=slot_rows(),
+                columns=["time_second", "colors", "speeds"],
+            )
+            elapsed = time.perf_counter() - started
+            print(f"      ... Xong trong {elapsed:.1f}s")
+
+    # 4. Ghi kho frame nhị phân cho /traffic/live (mmap, không cần truy vấn DB)
+    # Ma trận màu (slot x seq) và tốc độ (seq x slot) dựng thẳng từ các cột NumPy
+    print(f"4️⃣ Đang ghi kho frame nhị phân '{settings.traffic_store_path}'...")
+    interval, loop_duration = traffic_store.DATA_INTERVAL, traffic_store.LOOP_DURATION
+    slot_count = loop_duration // interval
+    in_loop = (frame_times % interval == 0) & (frame_times >= 0) & (frame_times < loop_duration)
+    slots, slot_seqs = frame_times[in_loop] // interval, seqs[in_loop]
+    color_matrix = np.zeros((slot_count, len(segment_order)), dtype=np.uint8)
+    color_matrix[slots, slot_seqs] = frame_colors[in_loop]
+    speed_matrix = np.full((len(segment_order), slot_count), np.nan, dtype=np.float32)
+    speed_matrix[slot_seqs, slots] = frame_speeds[in_loop]
+    traffic_store.write_frame_matrices(
+        settings.traffic_store_path,
+        segment_order,
+        color_matrix,
+        [segment_bounds[lane_id] for lane_id in segment_order],
+        interval,
+        loop_duration,
+        speeds=speed_matrix,
+    )
 
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"📈 Bộ nhớ đỉnh (peak RSS): {peak:,.0f} MB")
     print("--- 🎉 HOÀN TẤT! TỐC ĐỘ TÊN LỬA! ---")
 
 if __name__ == "__main__":
-    asyncio.run(process_data())
\ No newline at end of file
+    asyncio.run(process_data(sys.argv[1] if len(sys.argv) > 1 else None))
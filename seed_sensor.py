@@ -13,12 +13,10 @@
 # limitations under the License.
 
 import asyncio
-import httpx
 from app.core.config import settings
 from app.services import openaq
+from app.services.orion import OrionClient
 
-ORION_ENTITIES_URL = f"{settings.orion_broker_url}/ngsi-ld/v1/entities"
-HEADERS = {"Content-Type": "application/ld+json", "Accept": "application/json"}
 CONTEXT = settings.ngsi_context_url
 
 async def seed_devices():
@@ -36,7 +34,7 @@ async def seed_devices():
 
     print(f"Tìm thấy {len(measurements)} trạm. Đang tạo thực thể Device...")
 
-    async with httpx.AsyncClient() as client:
+    async with OrionClient() as orion:
         for item in measurements:
             station_key = item["sensor_id"]
             station_name = item["station_name"]
@@ -75,7 +73,7 @@ async def seed_devices():
             }
 
             try:
-                resp = await client.post(ORION_ENTITIES_URL, json=payload, headers=HEADERS)
+                resp = await orion.create_entity(payload)
                 if resp.status_code == 201:
                     print(f"✅ Đã đăng ký Device: {station_name}")
                 elif resp.status_code == 409:
@@ -101,8 +101,8 @@ async def main():
     # Bước 3.1: Tạo bảng & Admin
     run_command("init_db.py", "Khởi tạo Database & Admin")
 
-    # Bước 3.2: Xử lý dữ liệu JSON lớn (Giao thông)
-    run_command("Data/merge_json.py", "Gộp file dữ liệu mô phỏng")
+    # Bước 3.2: Chuyển dữ liệu mô phỏng sang định dạng chunk (bỏ qua nếu đã có)
+    run_command("Data/convert_trace.py", "Chuyển dữ liệu mô phỏng sang chunk NDJSON + zstd")
 
     # Bước 3.3: Nạp bản đồ nền (Công viên, Trạm sạc...) vào Postgres
     run_command("import_osm.py", "Import GeoJSON vào PostgreSQL")
@@ -12,104 +12,160 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""
+Đồng bộ green_locations từ Postgres sang Orion-LD.
+
+Mặc định chỉ đẩy các dòng có `updated_at` mới hơn mốc đã đồng bộ lần trước
+(bảng sync_state); `--full` đẩy lại tất cả. Các lô được gửi song song (giới
+hạn `--concurrency`) trên một OrionClient dùng chung.
+
+Script không thấy được dòng đã xóa: xóa qua API được đồng bộ bởi outbox
+(app/services/orion_outbox.py).
+"""
+
+import argparse
 import asyncio
-import httpx
+import time
+from datetime import timedelta
+
 from sqlalchemy import text
-from app.db.session import engine
-from app.core.config import settings
-from shapely import wkt  # <-- 1. Thay đổi import: Dùng wkt thay vì to_shape
+from app import models  # noqa: F401  (đăng ký bảng cho init_db)
+from app.db.session import engine, init_db
+from app.services.orion import OrionClient
 
-# Cấu hình Orion
-ORION_UPSERT_URL = f"{settings.orion_broker_url}/ngsi-ld/v1/entityOperations/upsert?options=update"
-# Dùng Context chuẩn Môi trường (giống các file khác)
+SYNC_NAME = "orion_locations"
+# Dùng Context chuẩn Giao thông (giống API locations)
 CONTEXT = "https://raw.githubusercontent.com/smart-data-models/dataModel.Transportation/master/context.jsonld"
-HEADERS = {"Content-Type": "application/ld+json", "Accept": "application/json"}
+BATCH_SIZE = 100
+CONCURRENCY = 4
+# Quét lùi một khoảng trước mốc: transaction ghi trước mốc nhưng commit sau
+# lần đồng bộ trước vẫn được đẩy (đẩy lại vài dòng là vô hại vì upsert idempotent).
+OVERLAP = timedelta(minutes=5)
+
+
+def build_entity(row) -> dict:
+    # location_type đọc bằng SQL thuần là chuỗi tên enum (vd. PUBLIC_PARK)
+    entity = {
+        "id": f"urn:ngsi-ld:{row.location_type}:{row.id}",
+        "type": row.location_type,
+        "name": {"type": "Property", "value": row.name},
+        "location": {
+            "type": "GeoProperty",
+            "value": {"type": "Point", "coordinates": [row.lon, row.lat]},
+        },
+        "source": {"type": "Property", "value": "PostgreSQL"},
+        "@context": CONTEXT,
+    }
+    if row.description:
+        entity["description"] = {"type": "Property", "value": row.description}
+    return entity
+
+
+async def load_high_water(conn):
+    result = await conn.execute(
+        text("SELECT high_water FROM sync_state WHERE name = :name"), {"name": SYNC_NAME}
+    )
+    return result.scalar()
+
+
+async def save_high_water(conn, high_water) -> None:
+    await conn.execute(
+        text("""
+            INSERT INTO sync_state (name, high_water, synced_at) VALUES (:name, :hw, now())
+            ON CONFLICT (name) DO UPDATE SET high_water = EXCLUDED.high_water, synced_at = now()
+        """),
+        {"name": SYNC_NAME, "hw": high_water},
+    )
+
+
+async def send_batch(orion: OrionClient, entities) -> bool:
+    try:
+        resp = await orion.upsert_entities(entities, timeout=30.0)
 
-async def sync_db_to_orion():
+        # 201: Created, 204: No Content (Updated success)
+        if resp.status_code == 207:
+            print(f"   ⚠️ Đã đẩy {len(entities)} entities (Multi-Status): {resp.text[:200]}")
+            return False
+        print(f"   -> Đã đẩy {len(entities)} entities.")
+        return True
+    except Exception as e:
+        print(f"   ❌ Lỗi Orion: {e}")
+        return False
+
+
+async def sync_db_to_orion(full: bool = False, batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY):
     print("--- 🔄 BẮT ĐẦU ĐỒNG BỘ TỪ POSTGRES SANG ORION ---")
-    
-    async with engine.begin() as conn:
-        # --- 2. SỬA CÂU TRUY VẤN ---
-        # Dùng ST_AsText(location) để lấy chuỗi WKT (dễ xử lý hơn raw binary)
-        query = text("""
-            SELECT id, name, location_type, description, ST_AsText(location) as location_wkt 
+    # Bảo đảm có cột updated_at và bảng sync_state khi chạy độc lập với API
+    await init_db()
+    started = time.perf_counter()
+
+    async with engine.connect() as conn:
+        since = None if full else await load_high_water(conn)
+        await conn.commit()
+
+        where = "location IS NOT NULL"
+        params = {}
+        if since is not None:
+            where += " AND updated_at > :since"
+            params["since"] = since - OVERLAP
+            print(f"📌 Đồng bộ tăng dần: các dòng thay đổi sau {since.isoformat()}")
+        else:
+            print("📌 Đồng bộ toàn bộ")
+
+        # Tọa độ lấy thẳng bằng ST_X/ST_Y, không cần parse WKT
+        query = text(f"""
+            SELECT id, name, location_type::text AS location_type, description,
+                   ST_X(location) AS lon, ST_Y(location) AS lat, updated_at
             FROM green_locations
+            WHERE {where}
+            ORDER BY updated_at, id
         """)
-        result = await conn.execute(query)
-        rows = result.all()
-        
-        print(f"📦 Tìm thấy {len(rows)} địa điểm trong DB. Đang đẩy sang Orion...")
-        
-        batch_entities = []
-        
-        for row in rows:
-            # Bỏ qua nếu không có tọa độ
-            if not row.location_wkt:
-                continue
-
-            # --- 3. XỬ LÝ TỌA ĐỘ ---
-            # Dùng wkt.loads để đọc chuỗi "POINT(105.8 21.0)"
+
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = []
+        high_water = since
+        total = 0
+
+        async def send(entities):
             try:
-                point = wkt.loads(row.location_wkt)
-                
-                # Tạo ID chuẩn: urn:ngsi-ld:PUBLIC_PARK:1 (Dùng ID số của Postgres)
-                # Lưu ý: row.location_type trong DB có thể là enum hoặc string
-                # Nếu là enum python, cần .value, nếu là string raw từ SQL thì dùng trực tiếp
-                loc_type = row.location_type
-                # Xử lý trường hợp nó trả về object Enum của Python
-                if hasattr(loc_type, 'value'):
-                    loc_type = loc_type.value
-                
-                entity_id = f"urn:ngsi-ld:{loc_type}:{row.id}"
-                
-                entity = {
-                    "id": entity_id,
-                    "type": loc_type,
-                    "name": {"type": "Property", "value": row.name},
-                    "location": {
-                        "type": "GeoProperty",
-                        "value": {
-                            "type": "Point",
-                            "coordinates": [point.x, point.y] # Lon, Lat
-                        }
-                    },
-                    "source": {"type": "Property", "value": "PostgreSQL"},
-                    "@context": CONTEXT
-                }
-                
-                if row.description:
-                    entity["description"] = {"type": "Property", "value": row.description}
-                    
-                batch_entities.append(entity)
-            except Exception as e:
-                print(f"⚠️ Lỗi xử lý dòng ID {row.id}: {e}")
-                continue
-            
-            # Gửi từng lô 100 cái
-            if len(batch_entities) >= 100:
-                await send_batch(batch_entities)
-                batch_entities = []
-        
-        # Gửi nốt lô cuối
-        if batch_entities:
-            await send_batch(batch_entities)
-
-    print("--- ✅ ĐỒNG BỘ HOÀN TẤT ---")
-
-async def send_batch(entities):
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(ORION_UPSERT_URL, json=entities, headers=HEADERS, timeout=30.0)
-            
-            # 201: Created, 204: No Content (Updated success)
-            if resp.status_code in [201, 204]:
-                print(f"   -> Đã đẩy {len(entities)} entities.")
-            elif resp.status_code == 207:
-                print(f"   -> Đã đẩy {len(entities)} entities (Multi-Status).")
-            else:
-                print(f"   ❌ Lỗi Orion: {resp.status_code} - {resp.text}")
-        except Exception as e:
-            print(f"   ❌ Lỗi kết nối: {e}")
+                return await send_batch(orion, entities)
+            finally:
+                semaphore.release()
+
+        async with OrionClient(max_connections=max(concurrency, 1)) as orion:
+            batch = []
+            result = await conn.stream(query, params)
+            async for row in result:
+                batch.append(build_entity(row))
+                total += 1
+                high_water = row.updated_at if high_water is None else max(high_water, row.updated_at)
+                if len(batch) >= batch_size:
+                    # Chờ chỗ trống trước khi đọc tiếp: giới hạn số lô đang gửi và bộ nhớ
+                    await semaphore.acquire()
+                    tasks.append(asyncio.create_task(send(batch)))
+                    batch = []
+            # Gửi nốt lô cuối
+            if batch:
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(send(batch)))
+            results = await asyncio.gather(*tasks)
+
+        if not total:
+            print("✅ Không có thay đổi mới.")
+        elif all(results):
+            # Chỉ tiến mốc khi mọi lô thành công, lô lỗi sẽ được đẩy lại lần sau
+            await save_high_water(conn, high_water)
+            await conn.commit()
+        else:
+            print(f"⚠️ {results.count(False)}/{len(results)} lô lỗi, giữ nguyên mốc đồng bộ để chạy lại.")
+
+    print(f"--- ✅ ĐỒNG BỘ HOÀN TẤT: {total} địa điểm trong {time.perf_counter() - started:.1f}s ---")
+
 
 if __name__ == "__main__":
-    asyncio.run(sync_db_to_orion())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Đồng bộ địa điểm Postgres -> Orion-LD")
+    parser.add_argument("--full", action="store_true", help="Đẩy lại toàn bộ, bỏ qua mốc đồng bộ")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(sync_db_to_orion(args.full, args.batch_size, args.concurrency))
@@ -0,0 +1,63 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Mẫu điểm của LanePoints tất định và giữ hai đầu làn."""
+
+import random
+
+from app.services.lane_geometry import LanePoints, build_lane_line
+
+
+def _lane(count: int) -> list[tuple[float, float]]:
+    rng = random.Random(7)
+    return [(105.8 + i * 1e-6, 21.0 + i * 4e-7 + (rng.random() - 0.5) * 1e-7) for i in range(count)]
+
+
+def test_sample_independent_of_order_and_chunks():
+    points = _lane(20_000) * 2
+    random.Random(1).shuffle(points)
+
+    forward, backward = LanePoints(), LanePoints()
+    for point in points:
+        forward.add(point)
+    for point in reversed(points):
+        backward.add(point)
+
+    chunks = [LanePoints() for _ in range(4)]
+    for i, point in enumerate(points):
+        chunks[i % 4].add(point)
+    merged = LanePoints()
+    for chunk in reversed(chunks):
+        merged.merge(chunk)
+
+    assert sorted(forward) == sorted(backward) == sorted(merged)
+
+
+def test_sample_keeps_lane_ends():
+    points = _lane(20_000)
+    sample = LanePoints()
+    for point in points:
+        sample.add(point)
+
+    assert len(sample) < len(points)
+    line, full = build_lane_line(sample, 1.0), build_lane_line(points, 1.0)
+    assert {line.coords[0], line.coords[-1]} == {full.coords[0], full.coords[-1]}
+
+
+def test_small_lane_keeps_every_point():
+    points = _lane(100)
+    sample = LanePoints()
+    for point in points * 3:
+        sample.add(point)
+    assert sorted(sample) == sorted(points)
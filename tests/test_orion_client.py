@@ -0,0 +1,78 @@
+# Copyright 2025 HouHackathon-CQP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lượt thử half-open của CircuitBreaker luôn được trả lại (python -m pytest tests)."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.orion import CircuitBreaker, OrionClient
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    return breaker
+
+
+def test_cancelled_half_open_trial_is_released():
+    async def scenario():
+        started = asyncio.Event()
+
+        async def handler(request):
+            if request.url.path.endswith("/slow"):
+                started.set()
+                await asyncio.sleep(10)
+            return httpx.Response(200, json=[])
+
+        breaker = _half_open_breaker()
+        async with OrionClient(
+            "http://orion", breaker=breaker, retries=0, transport=httpx.MockTransport(handler)
+        ) as client:
+            trial = asyncio.create_task(client.request("GET", "/slow"))
+            await started.wait()
+            trial.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await trial
+
+            response = await client.request("GET", "/fast")
+            assert response.status_code == 200
+            assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_unexpected_error_in_half_open_trial_is_recorded():
+    async def scenario():
+        def handler(request):
+            if request.url.path.endswith("/broken"):
+                raise httpx.DecodingError("bad body", request=request)
+            return httpx.Response(200, json=[])
+
+        breaker = _half_open_breaker()
+        async with OrionClient(
+            "http://orion", breaker=breaker, retries=0, transport=httpx.MockTransport(handler)
+        ) as client:
+            with pytest.raises(httpx.DecodingError):
+                await client.request("GET", "/broken")
+
+            # reset_timeout=0: lỗi mở lại breaker nhưng lượt thử kế tiếp vẫn được đi
+            response = await client.request("GET", "/fast")
+            assert response.status_code == 200
+            assert breaker.state == "closed"
+
+    asyncio.run(scenario())